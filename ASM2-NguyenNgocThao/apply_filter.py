@@ -1,9 +1,73 @@
 import numpy as np
+from scipy import fft
 
-def apply_filter(image, filter_mask):
-    dft = np.fft.fft2(image)
+def mask_layout(image, mask_shape, half=None):
+    # True for a half-spectrum mask (rows, cols // 2 + 1), False for a centered,
+    # image shaped one. half=None infers it from the shape; for images of at
+    # most 2 columns both layouts have the same shape, and the mask is taken
+    # as centered unless half=True is passed.
+    rows, cols = image.shape
+    if half is None:
+        half = tuple(mask_shape) != image.shape
+    expected = (rows, cols // 2 + 1) if half else image.shape
+    if tuple(mask_shape) != expected:
+        layout = 'half-spectrum' if half else 'centered'
+        raise ValueError(f"{layout} mask for a {rows}x{cols} image must be {expected}, got {tuple(mask_shape)}")
+    if half and np.iscomplexobj(image):
+        raise ValueError("half-spectrum masks need a real image")
+    return half
+
+def working_copy(image, precision):
+    # the image in the float or complex type of precision, for the centered path
+    if np.iscomplexobj(image):
+        return image.astype(np.complex64 if precision == 'single' else np.complex128, copy=False)
+    return image.astype(np.float32 if precision == 'single' else np.float64, copy=False)
+
+def apply_filter(image, filter_mask, precision='double', half=None):
+    # filter_mask is either centered and image shaped, or, for a real image,
+    # a half-spectrum mask in the unshifted rfft2 layout (the half=True masks
+    # of the filters package), see mask_layout. The second goes through
+    # rfft2 / irfft2 without any shifts. precision='single' computes in
+    # complex64 / float32 on either path.
+    image = np.asarray(image)
+    dtype = np.float32 if precision == 'single' else np.float64
+    if mask_layout(image, filter_mask.shape, half):
+        spectrum = fft.rfft2(image.astype(dtype, copy=False))
+        spectrum *= filter_mask
+        return np.abs(fft.irfft2(spectrum, s=image.shape))
+    dft = fft.fft2(working_copy(image, precision))
     dft_shift = np.fft.fftshift(dft)
-    filtered_dft = dft_shift * filter_mask
+    filtered_dft = dft_shift * np.asarray(filter_mask, dtype=dtype)
     idft_shift = np.fft.ifftshift(filtered_dft)
-    filtered_image = np.fft.ifft2(idft_shift)
+    filtered_image = fft.ifft2(idft_shift)
     return np.abs(filtered_image)
+
+def apply_filters(image, masks, precision='double', workers=-1, batch_size=8, half=None):
+    # Filters one image with many masks, computing its forward transform only
+    # once. masks is a stack of masks in either layout accepted by
+    # apply_filter, or a list of (mask function, *args) specs such as
+    # (gaussian_lowpass_filter, 30), which are built as half-spectrum masks;
+    # half is passed on to mask_layout.
+    # The multiplies and inverse transforms run batch_size masks at a time,
+    # over `workers` FFT threads (-1: all cores). Returns (masks, rows, cols).
+    image = np.asarray(image)
+    if len(masks) and isinstance(masks[0], tuple):
+        masks = [function(image.shape, *args, half=True) for function, *args in masks]
+        half = True
+    masks = np.asarray(masks)
+    half = mask_layout(image, masks.shape[1:], half)
+    dtype = np.float32 if precision == 'single' else np.float64
+    if half:
+        spectrum = fft.rfft2(image.astype(dtype, copy=False), workers=workers)
+    else:
+        spectrum = np.fft.fftshift(fft.fft2(working_copy(image, precision), workers=workers))
+        masks = masks.astype(dtype, copy=False)
+    filtered_images = np.empty((len(masks),) + image.shape, dtype=dtype)
+    for start in range(0, len(masks), batch_size):
+        filtered = spectrum * masks[start:start + batch_size]
+        if half:
+            filtered = fft.irfft2(filtered, s=image.shape, workers=workers, overwrite_x=True)
+        else:
+            filtered = fft.ifft2(np.fft.ifftshift(filtered, axes=(-2, -1)), workers=workers, overwrite_x=True)
+        np.abs(filtered, out=filtered_images[start:start + batch_size])
+    return filtered_images
@@ -0,0 +1,259 @@
+import argparse
+import csv
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+import numpy as np
+from PIL import Image
+from apply_filter import apply_filters
+from filters.low_pass_filters import ideal_lowpass_filter, gaussian_lowpass_filter, butterworth_lowpass_filter
+from filters.high_pass_filters import ideal_highpass_filter, gaussian_highpass_filter, butterworth_highpass_filter
+from filters.notch_filter import notch_filter
+
+IMAGE_EXTENSIONS = ('.tif', '.tiff', '.png', '.jpg', '.jpeg', '.bmp')
+
+# mask stacks of this many image shapes stay in shared memory while no
+# image of that shape is pending, in case more of that shape follow
+IDLE_MASK_SHAPES = 4
+
+# shared memory blocks this worker process has attached to, by name; at most
+# ATTACHED_MASKS mask stacks stay attached, so blocks the parent has released
+# are unmapped here as well
+_attached = {}
+_attached_masks = []
+ATTACHED_MASKS = 2
+
+
+def filter_bank(cutoff=30, order=2, notch_radius=10, notch_center=(30, 30)):
+    # (name, mask function, args) of every filter applied to each image
+    return [
+        ('ideal_lowpass', ideal_lowpass_filter, (cutoff,)),
+        ('gaussian_lowpass', gaussian_lowpass_filter, (cutoff,)),
+        ('butterworth_lowpass', butterworth_lowpass_filter, (cutoff, order)),
+        ('ideal_highpass', ideal_highpass_filter, (cutoff,)),
+        ('gaussian_highpass', gaussian_highpass_filter, (cutoff,)),
+        ('butterworth_highpass', butterworth_highpass_filter, (cutoff, order)),
+        ('notch', notch_filter, (notch_radius,) + tuple(notch_center)),
+    ]
+
+
+def find_images(inputs):
+    # an image given more than once (directly or through its directory) is listed once
+    images = []
+    seen = set()
+    for path in inputs:
+        if os.path.isdir(path):
+            found = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                     if name.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            found = [path] if path.lower().endswith(IMAGE_EXTENSIONS) else []
+        for image in found:
+            key = os.path.normcase(os.path.realpath(image))
+            if key not in seen:
+                seen.add(key)
+                images.append(image)
+    return images
+
+
+def output_stems(paths):
+    # Result names without the filter suffix, relative to the output
+    # directory: each image's path below the common directory of all images,
+    # so equal names in different directories stay apart. Images that differ
+    # only in their extension (x.png, x.tif) keep it in the name (x_png, x_tif).
+    directories = [os.path.dirname(os.path.abspath(path)) for path in paths]
+    base = os.path.commonpath(directories) if paths else ''
+    stems = [os.path.relpath(os.path.splitext(os.path.abspath(path))[0], base) for path in paths]
+    counts = {}
+    for stem in stems:
+        counts[os.path.normcase(stem)] = counts.get(os.path.normcase(stem), 0) + 1
+    unique = []
+    for path, stem in zip(paths, stems):
+        if counts[os.path.normcase(stem)] > 1:
+            stem += '_' + os.path.splitext(path)[1][1:].lower()
+        unique.append(stem)
+    clashes = len(unique) - len(set(os.path.normcase(stem) for stem in unique))
+    if clashes:
+        raise ValueError(f"{clashes} images would be written to the same output files")
+    return unique
+
+
+def load_image(path):
+    # grayscale, as cv2.imread(path, 0) in the assignment scripts
+    with Image.open(path) as image:
+        if image.mode not in ('L', 'I;16', 'I', 'F'):
+            image = image.convert('L')
+        return np.asarray(image)
+
+
+def to_shared(array):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return block
+
+
+def _shared_array(name, shape, dtype):
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype, buffer=_attached[name].buf)
+
+
+def _detach(name):
+    block = _attached.pop(name, None)
+    if block is not None:
+        block.close()
+
+
+def save_result(path, result, output_format):
+    if output_format == 'npy':
+        np.save(path + '.npy', result.astype(np.float32))
+    else:
+        # stretched to 0 ... 255 like plt.imshow does when showing it
+        low, high = result.min(), result.max()
+        scaled = (result - low) * (255 / (high - low)) if high > low else np.zeros_like(result)
+        Image.fromarray(scaled.astype(np.uint8)).save(path + '.png')
+
+
+def _filter_image(stem, image_ref, masks_ref, names, output_dir, output_format, precision):
+    # runs in a worker: the image and the masks are read from shared memory
+    start = time.perf_counter()
+    image = _shared_array(*image_ref)
+    masks = _shared_array(*masks_ref)
+    if masks_ref[0] in _attached_masks:
+        _attached_masks.remove(masks_ref[0])
+    _attached_masks.append(masks_ref[0])
+    results = apply_filters(image, masks, precision, workers=1, half=True)
+    del image, masks
+    _detach(image_ref[0])
+    while len(_attached_masks) > ATTACHED_MASKS:
+        _detach(_attached_masks.pop(0))
+    filtered = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.join(output_dir, stem)), exist_ok=True)
+    for name, result in zip(names, results):
+        save_result(os.path.join(output_dir, f"{stem}_{name}"), result, output_format)
+    return filtered - start, time.perf_counter() - filtered
+
+
+def run_batch(paths, output_dir, bank, workers=None, precision='double', output_format='png', report=print):
+    # Filters every image with every filter of the bank across a process pool.
+    # Images and the per-shape stacks of half-spectrum masks are handed to the
+    # workers through shared memory. The masks of a shape are built once and
+    # kept while images of that shape are pending; afterwards only the
+    # IDLE_MASK_SHAPES most recently used shapes are kept, so a corpus of
+    # mostly distinct shapes does not fill up shared memory.
+    # Results mirror the input directories, see output_stems.
+    stems = output_stems(paths)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    names = [name for name, _, _ in bank]
+    # shape -> [block, masks shape, masks dtype, pending images], oldest use first
+    mask_blocks = OrderedDict()
+    timings = []
+    start = time.perf_counter()
+
+    def release_idle_masks():
+        idle = [shape for shape, entry in mask_blocks.items() if entry[3] == 0]
+        for shape in idle[:max(len(idle) - IDLE_MASK_SHAPES, 0)]:
+            block = mask_blocks.pop(shape)[0]
+            block.close()
+            block.unlink()
+
+    def collect(future):
+        path, image_block, shape, load_time, mask_time = pending.pop(future)
+        image_block.close()
+        image_block.unlink()
+        mask_blocks[shape][3] -= 1
+        release_idle_masks()
+        try:
+            filter_time, save_time = future.result()
+            error = ''
+        except Exception as e:
+            filter_time = save_time = 0.0
+            error = f"{type(e).__name__}: {e}"
+        timings.append([path, load_time, mask_time, filter_time, save_time, error])
+        report(f"[{len(timings)}/{len(paths)}] {path}" + (f" failed: {error}" if error else
+               f" (load {load_time:.3f} s, filter {filter_time:.3f} s, save {save_time:.3f} s)"))
+
+    pending = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, stem in zip(paths, stems):
+                load_start = time.perf_counter()
+                try:
+                    image = load_image(path)
+                except Exception as e:
+                    timings.append([path, 0.0, 0.0, 0.0, 0.0, f"{type(e).__name__}: {e}"])
+                    report(f"[{len(timings)}/{len(paths)}] {path} failed: {e}")
+                    continue
+                load_time = time.perf_counter() - load_start
+                mask_start = time.perf_counter()
+                if image.shape not in mask_blocks:
+                    masks = np.stack([function(image.shape, *args, half=True) for _, function, args in bank])
+                    mask_blocks[image.shape] = [to_shared(masks), masks.shape, masks.dtype, 0]
+                mask_blocks.move_to_end(image.shape)
+                mask_time = time.perf_counter() - mask_start
+                masks_block, masks_shape, masks_dtype, _ = mask_blocks[image.shape]
+                mask_blocks[image.shape][3] += 1
+                image_block = to_shared(image)
+                future = executor.submit(
+                    _filter_image, stem, (image_block.name, image.shape, image.dtype),
+                    (masks_block.name, masks_shape, masks_dtype), names, output_dir, output_format, precision)
+                pending[future] = (path, image_block, image.shape, load_time, mask_time)
+                # a bounded number of images in shared memory at a time
+                while len(pending) >= 2 * workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+    finally:
+        for path, image_block, _, _, _ in pending.values():
+            image_block.close()
+            image_block.unlink()
+        for block, _, _, _ in mask_blocks.values():
+            block.close()
+            block.unlink()
+
+    wall_time = time.perf_counter() - start
+    with open(os.path.join(output_dir, 'timing.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['image', 'load_s', 'masks_s', 'filter_s', 'save_s', 'error'])
+        writer.writerows(timings)
+    done_count = sum(1 for timing in timings if not timing[5])
+    report(f"{done_count} of {len(paths)} images, {len(bank)} filters each, in {wall_time:.2f} s "
+           f"({done_count / wall_time:.2f} images/s)")
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the low-pass, high-pass and notch filters over image directories")
+    parser.add_argument('inputs', nargs='*', default=['DIP3E_Original_Images_CH04'],
+                        help="image files or directories")
+    parser.add_argument('-o', '--output-dir', default='filtered_images')
+    parser.add_argument('--cutoff', type=float, default=30)
+    parser.add_argument('--order', type=int, default=2, help="order of the Butterworth filters")
+    parser.add_argument('--notch-radius', type=float, default=10)
+    parser.add_argument('--notch-center', type=int, nargs=2, default=(30, 30), metavar=('U0', 'V0'))
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--precision', choices=['double', 'single'], default='double')
+    parser.add_argument('--format', choices=['png', 'npy'], default='png',
+                        help="png: stretched to 8 bits, npy: float32 values")
+    args = parser.parse_args(argv)
+
+    paths = find_images(args.inputs)
+    if not paths:
+        parser.error("no images found")
+    try:
+        output_stems(paths)
+    except ValueError as e:
+        parser.error(str(e))
+    bank = filter_bank(args.cutoff, args.order, args.notch_radius, args.notch_center)
+    timings = run_batch(paths, args.output_dir, bank, args.workers, args.precision, args.format)
+    return 1 if any(timing[5] for timing in timings) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,34 @@
+import numpy as np
+from functools import lru_cache
+
+
+def distance_grid(size, offset=(0, 0), half=False, rows=None):
+    # distance of every (u, v) of a size mask to the point offset from its
+    # center (rows // 2, cols // 2), computed once per shape and shared, so read-only.
+    # With half=True the grid is laid out like np.fft.rfft2 output instead:
+    # unshifted, zero frequency at [0, 0], only cols // 2 + 1 columns.
+    # rows=(start, stop) gives only those rows of the grid; such strips are
+    # not cached.
+    if rows is None:
+        return _cached_distance_grid(size, offset, half)
+    return _distance_grid(size, offset, half, rows)
+
+
+@lru_cache(maxsize=8)
+def _cached_distance_grid(size, offset, half):
+    D = _distance_grid(size, offset, half)
+    D.setflags(write=False)
+    return D
+
+
+def _distance_grid(size, offset, half, rows=None):
+    num_rows, cols = size
+    if half:
+        u = np.fft.fftfreq(num_rows, 1 / num_rows).astype(int) - offset[0]
+        v = np.arange(cols // 2 + 1) - offset[1]
+    else:
+        u = np.arange(num_rows) - (num_rows // 2 + offset[0])
+        v = np.arange(cols) - (cols // 2 + offset[1])
+    if rows is not None:
+        u = u[rows[0]:rows[1]]
+    return np.sqrt(u[:, np.newaxis] ** 2 + v[np.newaxis, :] ** 2)
@@ -1,32 +1,17 @@
 import numpy as np
+from filters.frequency_grid import distance_grid
 
-def ideal_lowpass_filter(size, cutoff):
-    rows, cols = size
-    center = (rows // 2, cols // 2)
-    filter_mask = np.zeros((rows, cols), dtype=np.float32)
-    for u in range(rows):
-        for v in range(cols):
-            D = np.sqrt((u - center[0]) ** 2 + (v - center[1]) ** 2)
-            if D <= cutoff:
-                filter_mask[u, v] = 1
-    return filter_mask
+# half=True gives the mask in the unshifted rfft2 layout used by apply_filter's
+# fast path, rows=(start, stop) only those rows of the mask
 
-def gaussian_lowpass_filter(size, cutoff):
-    rows, cols = size
-    center = (rows // 2, cols // 2)
-    filter_mask = np.zeros((rows, cols), dtype=np.float32)
-    for u in range(rows):
-        for v in range(cols):
-            D = np.sqrt((u - center[0]) ** 2 + (v - center[1]) ** 2)
-            filter_mask[u, v] = np.exp(-(D ** 2) / (2 * (cutoff ** 2)))
-    return filter_mask
+def ideal_lowpass_filter(size, cutoff, half=False, rows=None):
+    D = distance_grid(tuple(size), half=half, rows=rows)
+    return (D <= cutoff).astype(np.float32)
 
-def butterworth_lowpass_filter(size, cutoff, order=2):
-    rows, cols = size
-    center = (rows // 2, cols // 2)
-    filter_mask = np.zeros((rows, cols), dtype=np.float32)
-    for u in range(rows):
-        for v in range(cols):
-            D = np.sqrt((u - center[0]) ** 2 + (v - center[1]) ** 2)
-            filter_mask[u, v] = 1 / (1 + (D / cutoff) ** (2 * order))
-    return filter_mask
+def gaussian_lowpass_filter(size, cutoff, half=False, rows=None):
+    D = distance_grid(tuple(size), half=half, rows=rows)
+    return np.exp(-(D ** 2) / (2 * (cutoff ** 2))).astype(np.float32)
+
+def butterworth_lowpass_filter(size, cutoff, order=2, half=False, rows=None):
+    D = distance_grid(tuple(size), half=half, rows=rows)
+    return (1 / (1 + (D / cutoff) ** (2 * order))).astype(np.float32)
@@ -1,13 +1,8 @@
 import numpy as np
+from filters.frequency_grid import distance_grid
 
-def notch_filter(size, cutoff, u0, v0):
-    rows, cols = size
-    center = (rows // 2, cols // 2)
-    filter_mask = np.ones((rows, cols), dtype=np.float32)
-    for u in range(rows):
-        for v in range(cols):
-            D1 = np.sqrt((u - center[0] - u0) ** 2 + (v - center[1] - v0) ** 2)
-            D2 = np.sqrt((u - center[0] + u0) ** 2 + (v - center[1] + v0) ** 2)
-            if D1 <= cutoff or D2 <= cutoff:
-                filter_mask[u, v] = 0
-    return filter_mask
+def notch_filter(size, cutoff, u0, v0, half=False, rows=None):
+    # zero around (u0, v0) and its mirror (-u0, -v0), relative to the center
+    D1 = distance_grid(tuple(size), (u0, v0), half, rows)
+    D2 = distance_grid(tuple(size), (-u0, -v0), half, rows)
+    return np.where((D1 <= cutoff) | (D2 <= cutoff), 0, 1).astype(np.float32)
@@ -2,63 +2,40 @@ import numpy as np
 import cv2
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
+from filters.frequency_grid import distance_grid
+from apply_filter import apply_filters
 
 # Hàm để tạo bộ lọc lý tưởng (Ideal) - Vuông
 
 
 def ideal_lowpass_filter(size, cutoff):
-    rows, cols = size
-    center = (int(rows / 2), int(cols / 2))
-    filter_matrix = np.zeros((rows, cols), dtype=np.float32)
-
-    for i in range(rows):
-        for j in range(cols):
-            distance = np.sqrt((i - center[0]) ** 2 + (j - center[1]) ** 2)
-            if distance <= cutoff:
-                filter_matrix[i, j] = 1
+    # khoảng cách từ mỗi điểm đến tâm, tính một lần cho mỗi kích thước ảnh
+    distance = distance_grid(tuple(size))
+    filter_matrix = (distance <= cutoff).astype(np.float32)
     return filter_matrix
 
 # Hàm để tạo bộ lọc tròn
 
 
 def circular_lowpass_filter(size, cutoff):
-    rows, cols = size
-    center = (int(rows / 2), int(cols / 2))
-    filter_matrix = np.zeros((rows, cols), dtype=np.float32)
-
-    for i in range(rows):
-        for j in range(cols):
-            distance = np.sqrt((i - center[0]) ** 2 + (j - center[1]) ** 2)
-            filter_matrix[i, j] = 1 / (1 + (distance / cutoff) ** 2)
+    distance = distance_grid(tuple(size))
+    filter_matrix = (1 / (1 + (distance / cutoff) ** 2)).astype(np.float32)
     return filter_matrix
 
 # Hàm để tạo bộ lọc Gaussian
 
 
 def gaussian_lowpass_filter(size, cutoff):
-    rows, cols = size
-    center = (int(rows / 2), int(cols / 2))
-    filter_matrix = np.zeros((rows, cols), dtype=np.float32)
-
-    for i in range(rows):
-        for j in range(cols):
-            distance = np.sqrt((i - center[0]) ** 2 + (j - center[1]) ** 2)
-            filter_matrix[i,
-                          j] = np.exp(-(distance ** 2) / (2 * (cutoff ** 2)))
+    distance = distance_grid(tuple(size))
+    filter_matrix = np.exp(-(distance ** 2) / (2 * (cutoff ** 2))).astype(np.float32)
     return filter_matrix
 
 # Hàm để tạo bộ lọc Butterworth
 
 
 def butterworth_lowpass_filter(size, cutoff, order=2):
-    rows, cols = size
-    center = (int(rows / 2), int(cols / 2))
-    filter_matrix = np.zeros((rows, cols), dtype=np.float32)
-
-    for i in range(rows):
-        for j in range(cols):
-            distance = np.sqrt((i - center[0]) ** 2 + (j - center[1]) ** 2)
-            filter_matrix[i, j] = 1 / (1 + (distance / cutoff) ** (2 * order))
+    distance = distance_grid(tuple(size))
+    filter_matrix = (1 / (1 + (distance / cutoff) ** (2 * order))).astype(np.float32)
     return filter_matrix
 
 # Hàm để hiển thị đáp ứng của các bộ lọc 2D và 3D
@@ -81,25 +58,6 @@ def plot_filter_response(filter_matrix, title):
     ax.set_title(f'3D Response - {title}')
     plt.show()
 
-# Thực hiện lọc ảnh
-
-
-def apply_filter(image, filter_matrix):
-    # Chuyển đổi ảnh sang domain tần số
-    dft = np.fft.fft2(image)
-    dft_shift = np.fft.fftshift(dft)
-
-    # Áp dụng bộ lọc
-    filtered_dft = dft_shift * filter_matrix
-
-    # Chuyển ngược lại domain không gian
-    inverse_dft = np.fft.ifftshift(filtered_dft)
-    filtered_image = np.fft.ifft2(inverse_dft)
-    filtered_image = np.abs(filtered_image)
-
-    return filtered_image
-
-
 # Đọc ảnh đầu vào từ file đã tải lên
 # Đường dẫn đến file bạn đã tải lên
 image_path = 'D:\Cá nhân\MSE\Xử lý tín hiệu số\ASM2-NguyenNgocThao\Fig0417(a)(barbara).png'
@@ -123,11 +81,10 @@ else:
     plot_filter_response(gaussian_filter, 'Gaussian Lowpass Filter')
     plot_filter_response(butterworth_filter, 'Butterworth Lowpass Filter')
 
-    # Lọc ảnh với các bộ lọc
-    filtered_image_ideal = apply_filter(image, ideal_filter)
-    filtered_image_circular = apply_filter(image, circular_filter)
-    filtered_image_gaussian = apply_filter(image, gaussian_filter)
-    filtered_image_butterworth = apply_filter(image, butterworth_filter)
+    # Lọc ảnh với các bộ lọc, biến đổi Fourier của ảnh chỉ tính một lần
+    (filtered_image_ideal, filtered_image_circular,
+     filtered_image_gaussian, filtered_image_butterworth) = apply_filters(
+        image, [ideal_filter, circular_filter, gaussian_filter, butterworth_filter])
 
     # Hiển thị kết quả
     plt.figure(figsize=(12, 10))
@@ -0,0 +1,123 @@
+import unittest
+import warnings
+import numpy as np
+from apply_filter import apply_filter, apply_filters
+from tiled_filter import spatial_kernel, fit_kernel, filter_tiled
+from filters.low_pass_filters import ideal_lowpass_filter, gaussian_lowpass_filter
+from filters.low_pass_filters import butterworth_lowpass_filter
+from filters.high_pass_filters import gaussian_highpass_filter, ideal_highpass_filter
+from filters.notch_filter import notch_filter
+
+
+def loop_mask(size, value, offsets=((0, 0),)):
+    # the masks as the original per-pixel loops built them: value(D) for the
+    # nearest of the given offsets from the center
+    rows, cols = size
+    center = (rows // 2, cols // 2)
+    filter_mask = np.zeros((rows, cols), dtype=np.float32)
+    for u in range(rows):
+        for v in range(cols):
+            D = min(np.sqrt((u - center[0] - u0) ** 2 + (v - center[1] - v0) ** 2) for u0, v0 in offsets)
+            filter_mask[u, v] = value(D)
+    return filter_mask
+
+
+class TestMasks(unittest.TestCase):
+    def test_masks_match_loops(self):
+        """Kiểm tra mặt nạ vector hóa giống hệt vòng lặp gốc, với ảnh kích thước chẵn, lẻ và notch lệch tâm"""
+        for shape in ((32, 32), (31, 45), (40, 17)):
+            cases = (
+                (ideal_lowpass_filter(shape, 7), loop_mask(shape, lambda D: 1 if D <= 7 else 0)),
+                (gaussian_lowpass_filter(shape, 5), loop_mask(shape, lambda D: np.exp(-(D ** 2) / (2 * (5 ** 2))))),
+                (butterworth_lowpass_filter(shape, 6, 3), loop_mask(shape, lambda D: 1 / (1 + (D / 6) ** (2 * 3)))),
+                (ideal_highpass_filter(shape, 7), 1 - loop_mask(shape, lambda D: 1 if D <= 7 else 0)),
+                (notch_filter(shape, 3, 5, -4), loop_mask(shape, lambda D: 0 if D <= 3 else 1, ((5, -4), (-5, 4)))),
+                (notch_filter(shape, 2, 0, 6), loop_mask(shape, lambda D: 0 if D <= 2 else 1, ((0, 6), (0, -6)))),
+            )
+            for mask, expected in cases:
+                self.assertEqual(mask.dtype, np.float32)
+                self.assertTrue(np.array_equal(mask, expected))
+            # the half layout is the same mask moved to rfft2 order
+            half_cases = (
+                (gaussian_lowpass_filter(shape, 5, half=True), cases[1][1]),
+                (notch_filter(shape, 3, 5, -4, half=True), cases[4][1]),
+            )
+            for mask, expected in half_cases:
+                self.assertTrue(np.array_equal(mask, np.fft.ifftshift(expected)[:, :shape[1] // 2 + 1]))
+
+
+class TestApplyFilter(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_half_mask_matches_centered_mask(self):
+        """Kiểm tra mặt nạ nửa phổ cho kết quả giống mặt nạ căn giữa, kể cả ảnh chỉ có 1 hoặc 2 cột"""
+        for shape in ((64, 48), (33, 2), (33, 1)):
+            image = self.rng.random(shape) * 255
+            expected = apply_filter(image, gaussian_highpass_filter(shape, 5))
+            half_mask = gaussian_highpass_filter(shape, 5, half=True)
+            np.testing.assert_allclose(apply_filter(image, half_mask, half=True), expected, atol=1e-9)
+            np.testing.assert_allclose(apply_filters(image, [half_mask], half=True)[0], expected, atol=1e-9)
+            np.testing.assert_allclose(apply_filters(image, [(gaussian_highpass_filter, 5)])[0], expected, atol=1e-9)
+
+    def test_wrong_mask_shape(self):
+        """Kiểm tra mặt nạ sai kích thước bị từ chối thay vì lọc sai"""
+        image = self.rng.random((64, 48))
+        for mask in (np.ones((64, 20)), np.ones((48, 64))):
+            with self.assertRaises(ValueError):
+                apply_filter(image, mask)
+        with self.assertRaises(ValueError):
+            apply_filter(image, np.ones((64, 48)), half=True)
+        with self.assertRaises(ValueError):
+            apply_filters(image, np.ones((2, 64, 25)), half=False)
+
+    def test_single_precision(self):
+        """Kiểm tra precision='single' được dùng ở cả hai dạng mặt nạ"""
+        image = self.rng.random((64, 48))
+        for mask in (ideal_lowpass_filter(image.shape, 10), ideal_lowpass_filter(image.shape, 10, half=True)):
+            expected = apply_filter(image, mask)
+            single = apply_filter(image, mask, 'single')
+            self.assertEqual(single.dtype, np.float32)
+            np.testing.assert_allclose(single, expected, atol=1e-5)
+            self.assertEqual(apply_filters(image, [mask], 'single').dtype, np.float32)
+
+
+class TestTiledFilter(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_full_kernel_matches_apply_filter(self):
+        """Kiểm tra lọc theo ô với nhân đủ một chu kỳ giống hệt apply_filter, kể cả phần viền quấn quanh ảnh"""
+        image = self.rng.random((65, 65))
+        for mask_function, cutoff in ((ideal_lowpass_filter, 10), (gaussian_highpass_filter, 6)):
+            # radius 32 covers every offset of a 65 x 65 image: the circular kernel itself
+            kernel = spatial_kernel(image.shape, (mask_function, cutoff), 32, block_pixels=1000)
+            output = np.zeros_like(image)
+            filter_tiled(image, kernel, output, tile_size=16)
+            expected = apply_filter(image, mask_function(image.shape, cutoff))
+            np.testing.assert_allclose(output, expected, atol=1e-10)
+
+    def test_radius_follows_image_size(self):
+        """Kiểm tra bán kính nhân tăng theo kích thước ảnh để sai số cắt nằm trong dung sai"""
+        image = self.rng.random((256, 192))
+        spec = (gaussian_lowpass_filter, 4)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            kernel, error = fit_kernel(image.shape, spec, radius=8, tolerance=1e-6)
+        # spatial sigma of about 256 / (2 pi 4) = 10 pixels
+        self.assertGreaterEqual(len(kernel) // 2, 32)
+        self.assertLess(error, 1e-6)
+        output = np.zeros_like(image)
+        filter_tiled(image, kernel, output, tile_size=50)
+        expected = apply_filter(image, gaussian_lowpass_filter(image.shape, 4))
+        self.assertLess(np.linalg.norm(output - expected) / np.linalg.norm(expected), 1e-5)
+
+    def test_warns_above_tolerance(self):
+        """Kiểm tra cảnh báo khi bán kính tối đa không đạt dung sai"""
+        with self.assertWarns(RuntimeWarning):
+            _, error = fit_kernel((128, 128), (ideal_lowpass_filter, 20), radius=4, max_radius=8)
+        self.assertGreater(error, 1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
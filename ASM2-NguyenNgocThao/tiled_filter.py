@@ -0,0 +1,200 @@
+import argparse
+import warnings
+import numpy as np
+from scipy import fft
+from filters.low_pass_filters import ideal_lowpass_filter, gaussian_lowpass_filter, butterworth_lowpass_filter
+from filters.high_pass_filters import ideal_highpass_filter, gaussian_highpass_filter, butterworth_highpass_filter
+from filters.notch_filter import notch_filter
+
+try:
+    import tifffile
+except ImportError:
+    # only needed for TIFF input and output
+    tifffile = None
+
+FILTERS = {
+    'ideal_lowpass': ideal_lowpass_filter,
+    'gaussian_lowpass': gaussian_lowpass_filter,
+    'butterworth_lowpass': butterworth_lowpass_filter,
+    'ideal_highpass': ideal_highpass_filter,
+    'gaussian_highpass': gaussian_highpass_filter,
+    'butterworth_highpass': butterworth_highpass_filter,
+    'notch': notch_filter,
+}
+
+
+def mask_blocks(image_shape, filter_mask, block_pixels=2 ** 20):
+    # Yields (first row, block of mask rows) with about block_pixels values
+    # each. filter_mask is an array (e.g. np.memmap) or a (mask function,
+    # *args) spec such as (gaussian_lowpass_filter, 30).
+    rows, cols = image_shape
+    block_rows = max(block_pixels // cols, 1)
+    for start in range(0, rows, block_rows):
+        stop = min(start + block_rows, rows)
+        if isinstance(filter_mask, tuple):
+            function, *args = filter_mask
+            yield start, function(image_shape, *args, rows=(start, stop))
+        else:
+            yield start, np.asarray(filter_mask[start:stop])
+
+
+def spatial_kernel(image_shape, filter_mask, radius, block_pixels=2 ** 20):
+    # The (2 * radius + 1) x (2 * radius + 1) center of the circular
+    # convolution kernel that a centered, image shaped frequency mask applies
+    # in apply_filter. It is a direct inverse DFT over blocks of mask rows,
+    # with the column phases made a chunk of columns at a time, so every
+    # temporary holds about block_pixels values whatever the image width and
+    # radius. The masks of the filters package are symmetric, so the kernel is real.
+    rows, cols = image_shape
+    size = 2 * radius + 1
+    offsets = np.arange(-radius, radius + 1)
+    # exp(2j pi n / N) looked up by n mod N, instead of an exp per phase
+    row_roots = np.exp(2j * np.pi * np.arange(rows) / rows)
+    col_roots = np.exp(2j * np.pi * np.arange(cols) / cols)
+    kernel = np.zeros((size, size), dtype=complex)
+    chunk = max(block_pixels // size, 1)
+    block_rows = max(min(block_pixels // cols, chunk), 1)
+    for start, block in mask_blocks(image_shape, filter_mask, block_rows * cols):
+        u = np.arange(start, start + len(block)) - rows // 2
+        row_phases = row_roots[np.outer(offsets, u) % rows]
+        weighted = np.zeros((len(block), size), dtype=complex)
+        for c0 in range(0, cols, chunk):
+            v = np.arange(c0, min(c0 + chunk, cols)) - cols // 2
+            weighted += block[:, c0:c0 + len(v)] @ col_roots[np.outer(v, offsets) % cols]
+        kernel += row_phases @ weighted
+    return kernel.real / (rows * cols)
+
+
+def kernel_energy(image_shape, filter_mask, block_pixels=2 ** 20):
+    # Energy of the full circular kernel and its center tap, straight from
+    # the mask: sum of kernel**2 is sum |mask|**2 / (rows * cols) (Parseval)
+    # and the center tap is the mean of the mask.
+    rows, cols = image_shape
+    energy = center = 0.0
+    for _, block in mask_blocks(image_shape, filter_mask, block_pixels):
+        # the masks are float32; the tail is a small difference of these sums
+        block = block.astype(np.result_type(block, np.float64), copy=False)
+        energy += np.sum(np.abs(block) ** 2)
+        center += np.sum(block).real
+    return energy / (rows * cols), center / (rows * cols)
+
+
+def truncation_error(kernel, energy):
+    # Relative L2 error of the truncated kernel: the energy the window leaves
+    # out over the energy of the full kernel without its center tap. The
+    # center tap is left out of the reference so that high-pass masks, whose
+    # kernel is a unit impulse minus a low-pass kernel, are measured against
+    # the low-pass part that they actually change.
+    total, center = energy
+    tail = max(total - np.sum(kernel ** 2), 0.0)
+    spread = total - center ** 2
+    if spread <= 0:
+        return 0.0
+    return float(np.sqrt(tail / spread))
+
+
+def fit_kernel(image_shape, filter_mask, radius=32, tolerance=1e-3, max_radius=1024):
+    # The masks are defined in DFT bins, so the spatial kernel grows with the
+    # image size (a Gaussian of cutoff D0 has a spatial sigma of about
+    # N / (2 pi D0)). Doubles radius until the truncation error is within
+    # tolerance, up to max_radius and half the image, and warns if it never
+    # gets there. Returns the kernel and its truncation error. Each step costs
+    # two to four times the one before, so the doubling at most doubles the
+    # cost of the final kernel.
+    radius_limit = max(min(min(image_shape) // 2 - 1, max_radius), 1)
+    energy = kernel_energy(image_shape, filter_mask)
+    radius = min(radius, radius_limit)
+    while True:
+        kernel = spatial_kernel(image_shape, filter_mask, radius)
+        error = truncation_error(kernel, energy)
+        if error <= tolerance or radius >= radius_limit:
+            break
+        radius = min(2 * radius, radius_limit)
+    if error > tolerance:
+        warnings.warn(f"kernel radius {radius} leaves a relative truncation error of {error:.3g}, "
+                      f"above the tolerance {tolerance:g}", RuntimeWarning)
+    return kernel, error
+
+
+def filter_tiled(image, kernel, output, tile_size=512, precision='double'):
+    # Overlap-save: each output tile is the valid part of the FFT convolution
+    # of its input tile plus a halo of kernel radius pixels, so only one tile
+    # and its halo are in memory at a time. The halo wraps around the image
+    # edges, as the DFT in apply_filter does. image and output only need 2-D
+    # indexing, e.g. np.memmap or a memory-mapped TIFF; output is written
+    # tile by tile.
+    rows, cols = image.shape
+    radius = len(kernel) // 2
+    dtype = np.float32 if precision == 'single' else np.float64
+    kernel = np.asarray(kernel, dtype=dtype)
+    # kernel spectra by padded tile shape; only the edge tiles differ
+    spectra = {}
+    for r0 in range(0, rows, tile_size):
+        r1 = min(r0 + tile_size, rows)
+        row_idx = np.arange(r0 - radius, r1 + radius) % rows
+        for c0 in range(0, cols, tile_size):
+            c1 = min(c0 + tile_size, cols)
+            col_idx = np.arange(c0 - radius, c1 + radius) % cols
+            tile = np.asarray(image[np.ix_(row_idx, col_idx)], dtype=dtype)
+            if tile.shape not in spectra:
+                spectra[tile.shape] = fft.rfft2(kernel, s=tile.shape)
+            filtered = fft.irfft2(fft.rfft2(tile) * spectra[tile.shape], s=tile.shape)
+            output[r0:r1, c0:c1] = np.abs(filtered[2 * radius:, 2 * radius:])
+    if hasattr(output, 'flush'):
+        output.flush()
+    return output
+
+
+def open_image(path):
+    # memory maps .npy files and uncompressed TIFFs, so tiles are read on demand
+    if path.lower().endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    if path.lower().endswith(('.tif', '.tiff')):
+        if tifffile is None:
+            raise ImportError("tifffile is needed for TIFF images")
+        return tifffile.memmap(path, mode='r')
+    raise ValueError(f"Unsupported image format: {path}")
+
+
+def create_output(path, shape, dtype=np.float32):
+    if path.lower().endswith('.npy'):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+    if path.lower().endswith(('.tif', '.tiff')):
+        if tifffile is None:
+            raise ImportError("tifffile is needed for TIFF images")
+        return tifffile.memmap(path, shape=shape, dtype=dtype)
+    raise ValueError(f"Unsupported image format: {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Filter an image too large for memory tile by tile")
+    parser.add_argument('input', help="grayscale .npy or uncompressed .tif image")
+    parser.add_argument('output', help=".npy or .tif file for the float32 result")
+    parser.add_argument('--filter', choices=sorted(FILTERS), default='gaussian_lowpass')
+    parser.add_argument('--cutoff', type=float, default=30)
+    parser.add_argument('--order', type=int, default=2, help="order of the Butterworth filters")
+    parser.add_argument('--notch-center', type=int, nargs=2, default=(0, 0), metavar=('U0', 'V0'))
+    parser.add_argument('--radius', type=int, default=32,
+                        help="starting kernel radius, i.e. the halo around each tile; doubled until within --tolerance")
+    parser.add_argument('--tolerance', type=float, default=1e-3, help="relative truncation error of the kernel")
+    parser.add_argument('--max-radius', type=int, default=1024)
+    parser.add_argument('--tile-size', type=int, default=512)
+    parser.add_argument('--precision', choices=['double', 'single'], default='double')
+    args = parser.parse_args(argv)
+
+    image = open_image(args.input)
+    if image.ndim != 2:
+        parser.error("only grayscale images are supported")
+    spec = (FILTERS[args.filter], args.cutoff)
+    if args.filter.startswith('butterworth'):
+        spec += (args.order,)
+    elif args.filter == 'notch':
+        spec += tuple(args.notch_center)
+    kernel, error = fit_kernel(image.shape, spec, args.radius, args.tolerance, args.max_radius)
+    print(f"kernel radius {len(kernel) // 2}, relative truncation error {error:.3g}")
+    output = create_output(args.output, image.shape)
+    filter_tiled(image, kernel, output, args.tile_size, args.precision)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import soundfile as sf
+from module_filter import ThreeBandEqualizer
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3')
+
+# one equalizer per worker process, so filter designs are reused across files
+_equalizer = None
+
+
+def find_files(inputs):
+    # every audio file in the given directories, files and glob patterns;
+    # a file matched by more than one input is listed once
+    files = []
+    seen = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*')
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS):
+                key = os.path.normcase(os.path.realpath(path))
+                if key not in seen:
+                    seen.add(key)
+                    files.append(path)
+    return files
+
+
+def output_names(files):
+    # Output wav paths relative to the output directory: each input's path
+    # below the common directory of all inputs, so equal names in different
+    # directories stay apart. Inputs that differ only in their extension
+    # (x.wav, x.flac) keep it in the name (x_wav.wav, x_flac.wav).
+    directories = [os.path.dirname(os.path.abspath(path)) for path in files]
+    base = os.path.commonpath(directories) if files else ''
+    stems = [os.path.relpath(os.path.splitext(os.path.abspath(path))[0], base) for path in files]
+    counts = {}
+    for stem in stems:
+        counts[os.path.normcase(stem)] = counts.get(os.path.normcase(stem), 0) + 1
+    names = []
+    for path, stem in zip(files, stems):
+        if counts[os.path.normcase(stem)] > 1:
+            stem += '_' + os.path.splitext(path)[1][1:].lower()
+        names.append(stem + '.wav')
+    clashes = len(names) - len(set(os.path.normcase(name) for name in names))
+    if clashes:
+        raise ValueError(f"{clashes} input files would be written to the same output file")
+    return names
+
+
+def _init_worker(gains_db, num_taps, cache_dir):
+    global _equalizer
+    _equalizer = ThreeBandEqualizer(num_taps=num_taps, cache_dir=cache_dir)
+    for band_idx, gain_db in enumerate(gains_db):
+        _equalizer.set_gain(band_idx, gain_db)
+
+
+def _equalize(input_path, output_path, retries):
+    # returns (input_path, seconds of audio, seconds spent, error or None)
+    error = None
+    for _ in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            _equalizer.equalize_file(input_path, output_path)
+            return input_path, sf.info(input_path).duration, time.perf_counter() - start, None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    return input_path, 0.0, 0.0, error
+
+
+def run_batch(files, output_dir, gains_db, workers=None, retries=1, num_taps=101, cache_dir=None,
+              report=print):
+    # equalizes files into output_dir as wav files, mirroring their directories
+    # (see output_names), across a pool of worker processes (one per core by
+    # default); failed files are retried, then skipped
+    names = output_names(files)
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(gains_db, num_taps, cache_dir)) as executor:
+        futures = []
+        for path, name in zip(files, names):
+            output_path = os.path.join(output_dir, name)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            futures.append(executor.submit(_equalize, path, output_path, retries))
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            path, _, elapsed, error = result
+            if error is None:
+                report(f"[{len(results)}/{len(files)}] {path} ({elapsed:.2f} s)")
+            else:
+                report(f"[{len(results)}/{len(files)}] {path} skipped: {error}")
+    wall_time = time.perf_counter() - start
+    done = [result for result in results if result[3] is None]
+    audio_time = sum(result[1] for result in done)
+    report(f"{len(done)} of {len(files)} files in {wall_time:.2f} s: "
+           f"{len(done) / wall_time:.2f} files/s, realtime factor {audio_time / wall_time:.1f}x")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Equalize audio files with the three band equalizer")
+    parser.add_argument('inputs', nargs='+', help="audio files, directories or glob patterns")
+    parser.add_argument('-o', '--output-dir', required=True, help="directory for the equalized wav files")
+    parser.add_argument('--low', type=float, default=0.0, help="low band gain in dB")
+    parser.add_argument('--mid', type=float, default=0.0, help="mid band gain in dB")
+    parser.add_argument('--high', type=float, default=0.0, help="high band gain in dB")
+    parser.add_argument('--taps', type=int, default=101, help="filter length")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--retries', type=int, default=1, help="attempts per failed file before skipping it")
+    parser.add_argument('--cache-dir', default=None, help="directory to keep filter designs in")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.inputs)
+    if not files:
+        parser.error("no audio files found")
+    try:
+        output_names(files)
+    except ValueError as e:
+        parser.error(str(e))
+    results = run_batch(files, args.output_dir, (args.low, args.mid, args.high), args.workers,
+                        args.retries, args.taps, args.cache_dir)
+    return 1 if any(result[3] is not None for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
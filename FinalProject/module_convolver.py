@@ -0,0 +1,99 @@
+import numpy as np
+
+
+class PartitionedConvolver:
+    # Uniformly partitioned overlap-save FIR convolution. The kernel is cut
+    # into partitions of block_size taps; each input block costs one forward
+    # and one inverse FFT of 2 * block_size points plus one complex
+    # multiply-add per partition, and its output is ready as soon as the
+    # block is in, so the latency is one block whatever the kernel length.
+    # Blocks are either 1-D or (block_size, channels); all channels share the
+    # kernel and go through the same FFT calls with a history of their own.
+    def __init__(self, kernel, block_size=1024, channels=1):
+        self.block_size = block_size
+        self.fft_size = 2 * block_size
+        self.channels = channels
+        self.num_partitions = 0
+        self.set_kernel(kernel)
+
+    def partition_spectra(self, kernel):
+        num_partitions = max(-(-len(kernel) // self.block_size), 1)
+        padded = np.zeros(num_partitions * self.block_size)
+        padded[:len(kernel)] = kernel
+        return np.fft.rfft(padded.reshape(num_partitions, self.block_size), n=self.fft_size, axis=1)
+
+    def set_kernel(self, kernel):
+        self.set_kernel_spectra(self.partition_spectra(kernel))
+
+    def set_kernel_spectra(self, spectra):
+        # keeps the input history, so the kernel can change while streaming
+        self.spectra = spectra
+        if len(spectra) != self.num_partitions:
+            self.num_partitions = len(spectra)
+            self.reset()
+        else:
+            self._broadcast_kernel()
+
+    def _broadcast_kernel(self):
+        # one kernel for every channel, stored per channel: multiplying with a
+        # broadcast (P, 1, bins) operand makes numpy buffer, i.e. allocate
+        self.kernel_spectra = np.repeat(self.spectra[:, np.newaxis, :], self.channels, axis=1)
+
+    def set_channels(self, channels):
+        if channels != self.channels:
+            self.channels = channels
+            self.reset()
+
+    def reset(self):
+        self._broadcast_kernel()
+        # channels first, so every transform runs along the contiguous last axis;
+        # two buffers take turns, so the shift by one block never copies a
+        # buffer onto itself (an overlapping copy goes through a temporary)
+        self.input_buffer = np.zeros((self.channels, self.fft_size))
+        self.spare_input_buffer = np.zeros((self.channels, self.fft_size))
+        # every spectrum is stored twice, so the newest num_partitions of them
+        # are always the contiguous slice [position:position + num_partitions]
+        self.delay_line = np.zeros((2 * self.num_partitions, self.channels, self.block_size + 1), dtype=complex)
+        self.position = 0
+        # scratch space, so process_into does not allocate
+        self.products = np.zeros((self.num_partitions, self.channels, self.block_size + 1), dtype=complex)
+        self.output_spectrum = np.zeros((self.channels, self.block_size + 1), dtype=complex)
+        self.output_buffer = np.zeros((self.channels, self.fft_size))
+
+    def process(self, block):
+        # filters the next block_size samples of the stream
+        self.set_channels(1 if block.ndim == 1 else block.shape[1])
+        output = np.empty(block.shape)
+        self.process_into(block, output)
+        return output
+
+    def process_into(self, block, out):
+        # like process, writing into out and working in preallocated buffers only
+        previous, self.input_buffer = self.input_buffer, self.spare_input_buffer
+        self.spare_input_buffer = previous
+        self.input_buffer[:, :self.block_size] = previous[:, self.block_size:]
+        self.input_buffer[:, self.block_size:] = block.T
+        self.position = (self.position - 1) % self.num_partitions
+        np.fft.rfft(self.input_buffer, out=self.delay_line[self.position])
+        self.delay_line[self.position + self.num_partitions] = self.delay_line[self.position]
+        history = self.delay_line[self.position:self.position + self.num_partitions]
+        np.multiply(history, self.kernel_spectra, out=self.products)
+        np.sum(self.products, axis=0, out=self.output_spectrum)
+        np.fft.irfft(self.output_spectrum, n=self.fft_size, out=self.output_buffer)
+        if out.ndim == 1:
+            out[:] = self.output_buffer[0, self.block_size:]
+        else:
+            out[:] = self.output_buffer[:, self.block_size:].T
+
+    def convolve(self, audio_data):
+        # filters a whole signal from a cleared state, like lfilter(kernel, 1, audio_data, axis=0)
+        self.set_channels(1 if audio_data.ndim == 1 else audio_data.shape[1])
+        self.reset()
+        num_blocks = -(-len(audio_data) // self.block_size)
+        padded = np.zeros((num_blocks * self.block_size,) + audio_data.shape[1:])
+        padded[:len(audio_data)] = audio_data
+        output = np.empty_like(padded)
+        for i in range(num_blocks):
+            block = slice(i * self.block_size, (i + 1) * self.block_size)
+            output[block] = self.process(padded[block])
+        return output[:len(audio_data)]
@@ -1,8 +1,43 @@
+import os
+import threading
+import time
+from functools import lru_cache
 import numpy as np
 from scipy import signal
 import soundfile as sf
-import sounddevice as sd
-import queue
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    # not installed, or no PortAudio library (e.g. on a headless server);
+    # everything but playback still works
+    sd = None
+from module_convolver import PartitionedConvolver
+from module_ringbuffer import RingBuffer
+from module_latency import CallbackStats
+
+
+@lru_cache(maxsize=64)
+def design_band_filter(sample_rate, num_taps, cutoff, window='hamming', cache_dir=None):
+    # firwin band-pass with cutoff = (low, high) in Hz, memoized in memory and,
+    # with cache_dir, on disk; the returned taps are shared, so read-only
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f"bandpass_{sample_rate}_{num_taps}_{cutoff[0]}_{cutoff[1]}_{window}.npy")
+        if os.path.exists(path):
+            taps = np.load(path)
+            taps.setflags(write=False)
+            return taps
+    taps = signal.firwin(num_taps, cutoff, pass_zero=False, window=window, fs=sample_rate)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # written under a temporary name first, so concurrent processes never
+        # load a half written file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.save(f, taps)
+        os.replace(temporary, path)
+    taps.setflags(write=False)
+    return taps
 
 
 class AudioFile:
@@ -16,9 +51,7 @@ class AudioFile:
 
     def load_file(self, filename):
         try:
-            audio_data, sample_rate = sf.read(filename, dtype='float32')
-            if len(audio_data.shape) > 1:
-                audio_data = np.mean(audio_data, axis=1, dtype='float32')
+            audio_data, sample_rate = sf.read(filename, dtype='float32', always_2d=True)
             self.audio_data = audio_data
             self.sample_rate = sample_rate
             self.current_position = 0
@@ -29,6 +62,35 @@ class AudioFile:
             print(f"Error loading audio file: {e}")
             return False
 
+    @property
+    def frames(self):
+        return 0 if self.audio_data is None else len(self.audio_data)
+
+    @property
+    def channels(self):
+        return 1 if self.audio_data is None or self.audio_data.ndim == 1 else self.audio_data.shape[1]
+
+    def is_loaded(self):
+        return self.audio_data is not None
+
+    def read_into(self, out):
+        # copies the next len(out) samples into out, zero padded at the end of
+        # the file; returns how many samples were copied, None at the end
+        if out.ndim > self.audio_data.ndim:
+            out = out[:, 0]
+        if self.current_position >= len(self.audio_data):
+            out[:] = 0
+            return None
+        count = min(len(out), len(self.audio_data) - self.current_position)
+        out[:count] = self.audio_data[self.current_position:self.current_position + count]
+        out[count:] = 0
+        self.current_position += count
+        return count
+
+    def blocks(self, block_size):
+        for start in range(0, len(self.audio_data), block_size):
+            yield self.audio_data[start:start + block_size]
+
     def get_next_chunk(self, chunk_size):
         if self.current_position >= len(self.audio_data):
             return None
@@ -36,24 +98,139 @@ class AudioFile:
         chunk = self.audio_data[self.current_position:end_pos]
         self.current_position = end_pos
         if len(chunk) < chunk_size:
-            chunk = np.pad(chunk, (0, chunk_size - len(chunk)))
+            # pads the time axis only; audio_data is (frames, channels)
+            chunk = np.pad(chunk, ((0, chunk_size - len(chunk)), (0, 0)))
         return chunk
 
     def seek(self, position):
         self.current_position = int(position * self.sample_rate)
 
+    def close(self):
+        self.audio_data = None
+
+
+class StreamingAudioFile:
+    # Plays a file straight from an open soundfile.SoundFile. A background
+    # thread reads it block by block into a small read-ahead buffer, which the
+    # audio callback empties without ever waiting on the disk, so opening and
+    # playing take the same time and memory whatever the length of the file.
+    BLOCK_SIZE = 4096
+    READ_AHEAD_BLOCKS = 16
+    POLL_INTERVAL = 0.005
+
+    def __init__(self):
+        self.sound_file = None
+        self.sample_rate = None
+        self.frames = 0
+        self.channels = 1
+        self.current_position = 0
+        self.duration = 0
+        self.is_playing = False
+        self.filename = None
+        self.reader = None
+        self.underruns = 0
+
+    def load_file(self, filename):
+        try:
+            sound_file = sf.SoundFile(filename)
+        except Exception as e:
+            print(f"Error loading audio file: {e}")
+            return False
+        self.close()
+        self.sound_file = sound_file
+        self.sample_rate = sound_file.samplerate
+        self.frames = sound_file.frames
+        self.channels = sound_file.channels
+        self.duration = self.frames / self.sample_rate
+        self.filename = filename
+        self.current_position = 0
+        self.read_ahead = RingBuffer(self.READ_AHEAD_BLOCKS * self.BLOCK_SIZE, channels=self.channels)
+        self.file_block = np.zeros((self.BLOCK_SIZE, self.channels), dtype=np.float32)
+        # counted in samples written to read_ahead: where the consumer is, where
+        # the data of the latest seek starts and where the file ends
+        self.read_count = 0
+        self.segment_start = 0
+        self.end_count = None
+        self.seek_request = None
+        self.running = True
+        self.reader = threading.Thread(target=self._read_ahead, daemon=True)
+        self.reader.start()
+        return True
+
+    def is_loaded(self):
+        return self.sound_file is not None
+
+    def _read_ahead(self):
+        buffer = self.read_ahead
+        while self.running:
+            if self.seek_request is not None:
+                frame, self.seek_request = self.seek_request, None
+                self.sound_file.seek(frame)
+                self.end_count = None
+                # everything buffered so far belongs to the old position
+                self.segment_start = buffer.write_count
+                continue
+            pending = buffer.write_count - max(self.read_count, self.segment_start)
+            if self.end_count is not None or buffer.capacity - pending < self.BLOCK_SIZE:
+                time.sleep(self.POLL_INTERVAL)
+                continue
+            count = len(self.sound_file.read(dtype='float32', always_2d=True, out=self.file_block))
+            buffer.write(self.file_block[:count])
+            if count < self.BLOCK_SIZE:
+                self.end_count = buffer.write_count
+
+    def read_into(self, out):
+        # copies the next len(out) frames into out, (frames, channels), and zero pads the rest;
+        # returns how many samples were copied (0 if the reader fell behind),
+        # None at the end of the file. Never waits for the reader thread.
+        if self.segment_start > self.read_count:
+            self.read_count = self.segment_start
+        count = min(len(out), self.read_ahead.write_count - self.read_count)
+        self.read_ahead.read(self.read_count, count, out[:count])
+        out[count:] = 0
+        self.read_count += count
+        self.current_position += count
+        if count == 0:
+            if self.end_count is not None and self.read_count >= self.end_count:
+                return None
+            self.underruns += 1
+        return count
+
+    def blocks(self, block_size):
+        # the whole file block by block, through a handle of its own so
+        # playback is not disturbed
+        with sf.SoundFile(self.filename) as sound_file:
+            yield from sound_file.blocks(blocksize=block_size, dtype='float32', always_2d=True)
+
+    def seek(self, position):
+        frame = min(max(int(position * self.sample_rate), 0), self.frames)
+        self.current_position = frame
+        self.seek_request = frame
+
+    def close(self):
+        if self.reader is not None:
+            self.running = False
+            self.reader.join()
+            self.reader = None
+        if self.sound_file is not None:
+            self.sound_file.close()
+            self.sound_file = None
+
 
 class AudioPlayer:
     def __init__(self, sample_rate, frame_size):
         self.sample_rate = sample_rate
         self.frame_size = frame_size
         self.stream = None
-        self.audio_file = AudioFile()
+        self.audio_file = StreamingAudioFile()
 
     def play(self, callback):
+        if sd is None:
+            print("Playback is not available: sounddevice could not be loaded")
+            return
         if self.stream is None or not self.stream.active:
             self.stream = sd.OutputStream(
-                channels=1,
+                channels=self.audio_file.channels,
                 samplerate=self.sample_rate,
                 blocksize=self.frame_size,
                 callback=callback
@@ -73,70 +250,206 @@ class AudioPlayer:
 
 
 class ThreeBandEqualizer:
-    def __init__(self):
+    # longer kernels are run through the partitioned FFT convolver
+    MAX_DIRECT_TAPS = 255
+    # band edges in Hz; edges at or above the Nyquist frequency of the loaded
+    # file are pulled down to MAX_CUTOFF of it, and a band left with no width
+    # (e.g. the high band below about 4.2 kHz) passes nothing
+    BANDS = [(20, 200), (200, 2000), (2000, 20000)]
+    MAX_CUTOFF = 0.95
+    WINDOW = 'hamming'
+
+    def __init__(self, num_taps=101, cache_dir=None):
         self.sample_rate = 44100
         self.frame_size = 1024
-        self.audio_queue = queue.Queue(maxsize=10)
-        self.nyquist = self.sample_rate / 2
-        self.low_cutoff = [20 / self.nyquist, 200 / self.nyquist]
-        self.mid_cutoff = [200 / self.nyquist, 2000 / self.nyquist]
-        self.high_cutoff = [2000 / self.nyquist, 20000 / self.nyquist]
+        # the last second or so of processed audio, for the visualization
+        self.visual_buffer = RingBuffer(64 * self.frame_size)
+        # timing of every callback since playback started
+        self.callback_stats = CallbackStats()
         self.gains = np.ones(3)
-        self.num_taps = 101
+        self.num_taps = num_taps
         # self.num_taps = 64
-        self.filters = self._design_filters()
+        # optional directory where filter designs are kept between runs
+        self.cache_dir = cache_dir
+        # the real-time callback always runs through the convolver
+        self.partitioned = self.num_taps > self.MAX_DIRECT_TAPS
+        self.convolver = PartitionedConvolver(np.zeros(self.num_taps), self.frame_size)
+        self._design_for_rate()
+        self.prepare_stream(self.frame_size)
         self.player = AudioPlayer(self.sample_rate, self.frame_size)
 
+    def _design_for_rate(self):
+        self.nyquist = self.sample_rate / 2
+        self.band_edges = [tuple(min(edge, self.MAX_CUTOFF * self.nyquist) for edge in band) for band in self.BANDS]
+        self.low_cutoff, self.mid_cutoff, self.high_cutoff = [
+            [edge / self.nyquist for edge in band] for band in self.band_edges]
+        self.filters = self._design_filters()
+        self.kernel = self._composite_kernel()
+        self.band_spectra = [self.convolver.partition_spectra(taps) for taps in self.filters]
+        self.convolver.set_kernel(self.kernel)
+        self.stream_state = None
+
     def _design_filters(self):
         filters = []
-        filters.append(signal.firwin(
-            self.num_taps, self.low_cutoff, pass_zero=False, window='hamming'))
-        filters.append(signal.firwin(
-            self.num_taps, self.mid_cutoff, pass_zero=False, window='hamming'))
-        filters.append(signal.firwin(
-            self.num_taps, self.high_cutoff, pass_zero=False, window='hamming'))
+        for cutoff in self.band_edges:
+            if cutoff[0] < cutoff[1]:
+                taps = design_band_filter(self.sample_rate, self.num_taps, cutoff, self.WINDOW, self.cache_dir)
+            else:
+                # the band starts above the highest usable frequency; its gain has nothing to act on
+                taps = np.zeros(self.num_taps)
+                taps.setflags(write=False)
+            filters.append(taps)
         return filters
 
+    def set_sample_rate(self, sample_rate):
+        # redesigns the band filters for a new rate; designs already made for
+        # it are taken from the cache
+        if sample_rate == self.sample_rate:
+            return
+        if self.MAX_CUTOFF * sample_rate / 2 <= self.BANDS[0][0]:
+            raise ValueError(f"Sample rate {sample_rate} Hz is too low for the equalizer bands")
+        self.sample_rate = sample_rate
+        self.player.sample_rate = sample_rate
+        self._design_for_rate()
+        self.reset_stream()
+
+    def load_file(self, filename):
+        if not self.player.load_file(filename):
+            return False
+        self.set_sample_rate(self.player.audio_file.sample_rate)
+        return True
+
+    def _composite_kernel(self):
+        # the gained band filters summed into one FIR with the same output
+        return np.sum([gain * taps for gain, taps in zip(self.gains, self.filters)], axis=0)
+
+    def _update_kernel(self):
+        self.kernel = self._composite_kernel()
+        # the partition spectra are linear in the gains as well
+        self.convolver.set_kernel_spectra(
+            np.sum([gain * spectra for gain, spectra in zip(self.gains, self.band_spectra)], axis=0))
+        self.stream_state = None
+
+    def prepare_stream(self, frames, channels=1):
+        # sizes the callback's scratch buffers once, before the stream starts
+        if self.convolver.block_size != frames:
+            self.convolver = PartitionedConvolver(self.kernel, frames, channels)
+            self.band_spectra = [self.convolver.partition_spectra(taps) for taps in self.filters]
+        self.convolver.set_channels(channels)
+        self.input_block = np.zeros((frames, channels))
+        self.output_block = np.zeros((frames, channels))
+        self.visual_block = np.zeros(frames)
+        self.callback_stats.reset()
+        self.reset_stream()
+
+    def reset_stream(self):
+        # forget the filter state, e.g. before playback starts or after a seek
+        self.stream_history = None
+        self.stream_state = None
+        self.convolver.reset()
+
+    def process_stream(self, chunk):
+        # filters one block of a continuous stream, 1-D or (frames, channels),
+        # carrying the filter state of every channel over from the previous
+        # block so block edges leave no transient
+        if self.partitioned:
+            # the convolver takes whole blocks: the chunk is zero padded and the
+            # output trimmed, like process_blocks does, so only the last chunk
+            # of a stream may be shorter than frame_size
+            block_size = self.convolver.block_size
+            padded = np.zeros((-(-len(chunk) // block_size) * block_size,) + chunk.shape[1:])
+            padded[:len(chunk)] = chunk
+            output = np.concatenate([self.convolver.process(padded[start:start + block_size])
+                                     for start in range(0, len(padded), block_size)])
+            return np.clip(output[:len(chunk)], -1.0, 1.0)
+        if self.stream_history is None or self.stream_history.shape[1:] != chunk.shape[1:]:
+            self.stream_history = np.zeros((self.num_taps - 1,) + chunk.shape[1:])
+            self.stream_state = None
+        if self.stream_state is None:
+            # the kernel changed: the state of an FIR filter only depends on the
+            # last num_taps - 1 inputs, so run the new kernel over those
+            _, self.stream_state = signal.lfilter(self.kernel, [1.0], self.stream_history, axis=0,
+                                                  zi=np.zeros_like(self.stream_history))
+        output, self.stream_state = signal.lfilter(self.kernel, [1.0], chunk, axis=0, zi=self.stream_state)
+        self.stream_history = np.concatenate((self.stream_history, chunk))[-(self.num_taps - 1):]
+        return np.clip(output, -1.0, 1.0)
+
     def process_audio(self, audio_data):
-        output = np.zeros_like(audio_data)
-        for i in range(3):
-            filtered = signal.lfilter(self.filters[i], [1.0], audio_data)
-            output += filtered * self.gains[i]
+        # audio_data is 1-D or (frames, channels), filtered along the sample axis
+        if self.partitioned:
+            # a convolver of its own, so a running stream keeps its state
+            output = PartitionedConvolver(self.kernel, self.frame_size).convolve(audio_data)
+        else:
+            output = signal.lfilter(self.kernel, [1.0], audio_data, axis=0)
         max_val = np.max(np.abs(output))
         if max_val > 1.0:
             output = output / max_val
         return output
 
     def process_full_audio(self):
-        if self.player.audio_file.audio_data is None:
+        if not self.player.audio_file.is_loaded():
             return None
-        return self.process_audio(self.player.audio_file.audio_data)
+        return self.process_audio(np.concatenate(list(self.player.audio_file.blocks(self.frame_size))))
+
+    def process_blocks(self, blocks, channels):
+        # (frames, channels) blocks filtered one by one, with a convolver of its own
+        convolver = PartitionedConvolver(self.kernel, self.frame_size)
+        block_in = np.zeros((self.frame_size, channels))
+        for block in blocks:
+            block_in[:len(block)] = block
+            block_in[len(block):] = 0
+            yield convolver.process(block_in)[:len(block)]
 
     def audio_callback(self, outdata, frames, time, status):
-        if status:
-            print(status)
-        chunk = self.player.audio_file.get_next_chunk(frames)
-        if chunk is None:
+        self.callback_stats.begin()
+        # everything below works in place on the buffers sized by prepare_stream
+        if self.player.audio_file.read_into(self.input_block) is None:
             self.player.stop()
-            self.player.audio_file.current_position = 0
+            self.player.audio_file.seek(0)
+            self.reset_stream()
             raise sd.CallbackStop()
-        processed = self.process_audio(chunk)
-        outdata[:] = processed.reshape(-1, 1)
-        try:
-            self.audio_queue.put_nowait(processed)
-        except queue.Full:
-            pass
+        self.convolver.process_into(self.input_block, self.output_block)
+        np.clip(self.output_block, -1.0, 1.0, out=self.output_block)
+        outdata[:] = self.output_block
+        # the visualization shows the channels mixed down
+        np.mean(self.output_block, axis=1, out=self.visual_block)
+        self.visual_buffer.write(self.visual_block)
+        self.callback_stats.end(frames, self.sample_rate, status)
 
     def set_gain(self, band_idx, gain_db):
-        self.gains[band_idx] = 10 ** (gain_db / 20)
+        gain = 10 ** (gain_db / 20)
+        if gain != self.gains[band_idx]:
+            self.gains[band_idx] = gain
+            self._update_kernel()
 
     def save_processed_audio(self, output_filename):
-        if self.player.audio_file.audio_data is None:
+        audio_file = self.player.audio_file
+        if not audio_file.is_loaded():
             return False
         try:
-            processed_audio = self.process_full_audio()
-            sf.write(output_filename, processed_audio, self.sample_rate)
+            self._write_processed(lambda: audio_file.blocks(self.frame_size), audio_file.channels, output_filename)
             return True
         except Exception as e:
             print(f"Error saving audio file: {e}")
             return False
+
+    def equalize_file(self, input_filename, output_filename):
+        # like save_processed_audio for a file that is not loaded in the player;
+        # errors are raised to the caller
+        def read_blocks():
+            with sf.SoundFile(input_filename) as input_file:
+                yield from input_file.blocks(blocksize=self.frame_size, dtype='float32', always_2d=True)
+        info = sf.info(input_filename)
+        self.set_sample_rate(info.samplerate)
+        self._write_processed(read_blocks, info.channels, output_filename)
+
+    def _write_processed(self, read_blocks, channels, output_filename):
+        # two passes over the input instead of holding it in memory: the
+        # first finds the peak that process_audio normalizes by
+        peak = 0.0
+        for block in self.process_blocks(read_blocks(), channels):
+            peak = max(peak, np.max(np.abs(block)))
+        scale = 1.0 / peak if peak > 1.0 else 1.0
+        with sf.SoundFile(output_filename, 'w', self.sample_rate, channels) as output:
+            for block in self.process_blocks(read_blocks(), channels):
+                output.write(block * scale)
@@ -0,0 +1,106 @@
+import csv
+import json
+import time
+import numpy as np
+
+
+class CallbackStats:
+    # Timing of the real-time audio callback. begin()/end() cost two clock
+    # reads and a few stores into preallocated arrays, so they can stay on in
+    # the callback. The last `capacity` callbacks are kept for percentiles and
+    # export; the histogram and the xrun counts cover every callback since reset().
+    def __init__(self, capacity=4096, bin_width=0.0001, num_bins=500):
+        self.capacity = capacity
+        self.bin_width = bin_width
+        self.num_bins = num_bins
+        self.durations = np.zeros(capacity)
+        self.deadlines = np.zeros(capacity)
+        self.histogram = np.zeros(num_bins, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.max_duration = 0.0
+        self.min_headroom = None
+        self.deadline_misses = 0
+        self.underflows = 0
+        self.overflows = 0
+        self.histogram[:] = 0
+        self.started = None
+
+    def begin(self):
+        self.started = time.perf_counter()
+
+    def end(self, frames, sample_rate, status=None):
+        duration = time.perf_counter() - self.started
+        deadline = frames / sample_rate
+        index = self.count % self.capacity
+        self.durations[index] = duration
+        self.deadlines[index] = deadline
+        self.count += 1
+        # the last bin also counts everything slower
+        self.histogram[min(int(duration / self.bin_width), self.num_bins - 1)] += 1
+        if duration > self.max_duration:
+            self.max_duration = duration
+        headroom = deadline - duration
+        if self.min_headroom is None or headroom < self.min_headroom:
+            self.min_headroom = headroom
+        if headroom < 0:
+            self.deadline_misses += 1
+        if status:
+            # sounddevice.CallbackFlags
+            if getattr(status, 'output_underflow', False) or getattr(status, 'input_underflow', False):
+                self.underflows += 1
+            if getattr(status, 'output_overflow', False) or getattr(status, 'input_overflow', False):
+                self.overflows += 1
+
+    def recent(self):
+        # (durations, deadlines) of the kept callbacks, oldest first
+        if self.count <= self.capacity:
+            return self.durations[:self.count].copy(), self.deadlines[:self.count].copy()
+        index = self.count % self.capacity
+        return np.roll(self.durations, -index), np.roll(self.deadlines, -index)
+
+    def summary(self):
+        # times in milliseconds
+        durations, deadlines = self.recent()
+        summary = {
+            'callbacks': self.count,
+            'deadline_ms': float(deadlines[-1] * 1000) if self.count else None,
+            'max_ms': self.max_duration * 1000,
+            'min_headroom_ms': None if self.min_headroom is None else self.min_headroom * 1000,
+            'deadline_misses': self.deadline_misses,
+            'underflows': self.underflows,
+            'overflows': self.overflows,
+        }
+        if len(durations):
+            summary['mean_ms'] = float(np.mean(durations) * 1000)
+            for percentile in (50, 95, 99):
+                summary[f'p{percentile}_ms'] = float(np.percentile(durations, percentile) * 1000)
+        return summary
+
+    def save_json(self, filename):
+        report = self.summary()
+        report['histogram'] = {
+            'bin_width_ms': self.bin_width * 1000,
+            'counts': self.histogram.tolist(),
+        }
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def save_csv(self, filename):
+        # one row per kept callback
+        durations, deadlines = self.recent()
+        first = self.count - len(durations)
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['callback', 'duration_ms', 'deadline_ms', 'headroom_ms'])
+            for i, (duration, deadline) in enumerate(zip(durations, deadlines)):
+                writer.writerow([first + i, duration * 1000, deadline * 1000, (deadline - duration) * 1000])
+
+    def save(self, filename):
+        # format chosen by the file extension
+        if filename.lower().endswith('.json'):
+            self.save_json(filename)
+        else:
+            self.save_csv(filename)
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Preallocated single-producer / single-consumer sample buffer. The
+    # producer only copies into the array and then advances write_count, so
+    # it never waits for the reader; the oldest samples are overwritten.
+    # The consumer can read any window of the last `capacity` samples and
+    # checks afterwards, against reserved_count (set before the producer
+    # starts copying), that the producer did not overwrite it meanwhile.
+    # With channels given, every sample is a row of that many values.
+    READ_RETRIES = 3
+
+    def __init__(self, capacity, dtype=np.float32, channels=None):
+        self.capacity = capacity
+        shape = (capacity,) if channels is None else (capacity, channels)
+        self.buffer = np.zeros(shape, dtype=dtype)
+        self.write_count = 0
+        self.reserved_count = 0
+
+    def write(self, data):
+        count = len(data)
+        if count > self.capacity:
+            data = data[count - self.capacity:]
+            self.write_count += count - self.capacity
+            count = self.capacity
+        self.reserved_count = self.write_count + count
+        start = self.write_count % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:count - first] = data[first:]
+        # published only after the samples are in place
+        self.write_count += count
+
+    def read(self, start, num_samples, out=None):
+        # copies samples start ... start + num_samples (counted from the first
+        # sample ever written) into out; returns None if they are not available
+        if start < 0 or start + num_samples > self.write_count or self.write_count - start > self.capacity:
+            return None
+        if out is None:
+            out = np.empty((num_samples,) + self.buffer.shape[1:], dtype=self.buffer.dtype)
+        begin = start % self.capacity
+        first = min(num_samples, self.capacity - begin)
+        out[:first] = self.buffer[begin:begin + first]
+        out[first:] = self.buffer[:num_samples - first]
+        if self.reserved_count - start > self.capacity:
+            # the producer reached the window while it was being copied
+            return None
+        return out
+
+    def latest(self, num_samples, out=None):
+        # the most recent num_samples samples, retried if the producer gets in the way
+        for _ in range(self.READ_RETRIES):
+            result = self.read(self.write_count - num_samples, num_samples, out)
+            if result is not None:
+                return result
+        return None
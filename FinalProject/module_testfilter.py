@@ -1,7 +1,18 @@
+import os
+import json
+import tempfile
+import time
 import unittest
+import tracemalloc
 import numpy as np
-from scipy.signal import freqz
-from module_filter import ThreeBandEqualizer
+import soundfile as sf
+from scipy.signal import freqz, lfilter
+from module_filter import ThreeBandEqualizer, AudioFile, StreamingAudioFile, design_band_filter
+from module_convolver import PartitionedConvolver
+from module_ringbuffer import RingBuffer
+from module_batch import find_files, output_names, run_batch
+from module_latency import CallbackStats
+from module_visualizer import octave_band_matrix
 
 
 class TestThreeBandEqualizer(unittest.TestCase):
@@ -107,6 +118,350 @@ class TestThreeBandEqualizer(unittest.TestCase):
         self.assertAlmostEqual(input_energy, output_energy, delta=0.1 * input_energy,
                                msg="High band filter did not retain energy for high frequency signal")
 
+    def test_composite_kernel(self):
+        """Kiểm tra bộ lọc tổng hợp bằng tổng ba băng tần đã nhân hệ số"""
+        self.equalizer.set_gain(0, 6)
+        self.equalizer.set_gain(2, -6)
+        test_signal = np.random.uniform(-0.1, 0.1, len(self.t))
+        expected = sum(lfilter(self.equalizer.filters[i], [1.0], test_signal) * self.equalizer.gains[i]
+                       for i in range(3))
+        np.testing.assert_allclose(lfilter(self.equalizer.kernel, [1.0], test_signal), expected, atol=1e-12)
+
+    def test_stream_matches_whole_signal(self):
+        """Kiểm tra xử lý theo khối liên tục giống xử lý toàn bộ tín hiệu, kể cả khi đổi gain"""
+        test_signal = np.random.uniform(-0.1, 0.1, 20 * self.equalizer.frame_size)
+        blocks = np.split(test_signal, 20)
+        output = [self.equalizer.process_stream(block) for block in blocks[:10]]
+        self.equalizer.set_gain(1, 6)
+        output += [self.equalizer.process_stream(block) for block in blocks[10:]]
+        output = np.concatenate(output)
+        half = 10 * self.equalizer.frame_size
+        new_kernel_output = lfilter(self.equalizer.kernel, [1.0], test_signal)
+        np.testing.assert_allclose(output[half:], new_kernel_output[half:], atol=1e-12)
+        self.assertFalse(np.allclose(output[:half], new_kernel_output[:half]))
+
+    def measure_callback(self, outdata, blocks):
+        # (peak, growth) of traced memory over `blocks` callbacks after a warm-up;
+        # the warm-up runs traced as well, as numpy keeps a few small objects
+        # from its first calls after tracing starts
+        frames = len(outdata)
+        for _ in range(10):
+            self.equalizer.audio_callback(outdata, frames, None, None)
+        tracemalloc.start()
+        try:
+            for _ in range(100):
+                self.equalizer.audio_callback(outdata, frames, None, None)
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            for _ in range(blocks):
+                self.equalizer.audio_callback(outdata, frames, None, None)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak - baseline, current - baseline
+
+    def test_callback_does_not_allocate(self):
+        """Kiểm tra callback thời gian thực không cấp phát bộ nhớ cho mỗi khối"""
+        frames = self.equalizer.frame_size
+        audio_file = self.equalizer.player.audio_file = AudioFile()
+        audio_file.audio_data = np.random.uniform(-0.5, 0.5, 1000 * frames).astype(np.float32)
+        self.equalizer.prepare_stream(frames)
+        outdata = np.zeros((frames, 1), dtype=np.float32)
+        peak, growth = self.measure_callback(outdata, 500)
+        # only the interpreter's own small temporaries (views, call arguments)
+        # may show up; a single float32 block would already take 4 * frames bytes
+        self.assertLess(peak, 4 * frames, "Callback allocates sample buffers per block")
+        self.assertLess(growth, 1024, "Callback memory grows with the number of blocks")
+        expected = lfilter(self.equalizer.kernel, [1.0], audio_file.audio_data[:audio_file.current_position])
+        np.testing.assert_allclose(outdata[:, 0], expected[-frames:], atol=1e-6)
+
+    def test_stereo_stream_callback_does_not_allocate(self):
+        """Kiểm tra callback không cấp phát bộ nhớ khi phát tệp hai kênh qua StreamingAudioFile"""
+        frames = self.equalizer.frame_size
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'stereo.wav')
+            audio_data = np.random.uniform(-0.5, 0.5, (200 * frames, 2))
+            sf.write(filename, audio_data, self.sample_rate, subtype='FLOAT')
+            audio_file = StreamingAudioFile()
+            audio_file.READ_AHEAD_BLOCKS = 64
+            self.assertTrue(audio_file.load_file(filename))
+            try:
+                # the whole file fits the read-ahead buffer; the reader thread is
+                # stopped once it is in, so only the callback is traced
+                while audio_file.end_count is None:
+                    time.sleep(0.01)
+                audio_file.running = False
+                audio_file.reader.join()
+                self.equalizer.player.audio_file = audio_file
+                self.equalizer.prepare_stream(frames, 2)
+                outdata = np.zeros((frames, 2), dtype=np.float32)
+                peak, growth = self.measure_callback(outdata, 30)
+            finally:
+                audio_file.reader = None
+                audio_file.close()
+        self.assertLess(peak, 4 * frames, "Callback allocates sample buffers per block")
+        self.assertLess(growth, 1024, "Callback memory grows with the number of blocks")
+        expected = lfilter(self.equalizer.kernel, [1.0], audio_data[:audio_file.current_position], axis=0)
+        np.testing.assert_allclose(outdata, expected[-frames:], atol=1e-6)
+
+
+class TestSampleRate(unittest.TestCase):
+    def test_filters_follow_sample_rate(self):
+        """Kiểm tra bộ lọc được thiết kế lại theo tần số lấy mẫu của tệp"""
+        equalizer = ThreeBandEqualizer()
+        for sample_rate in (48000, 96000, 32000):
+            equalizer.set_sample_rate(sample_rate)
+            self.assertEqual(equalizer.player.sample_rate, sample_rate)
+            nyquist = sample_rate / 2
+            for taps, (low, high) in zip(equalizer.filters, equalizer.band_edges):
+                self.assertLess(high, nyquist)
+                w, h = freqz(taps, worN=8000, fs=sample_rate)
+                center = np.sqrt(low * high)
+                self.assertGreater(np.abs(h[np.argmin(np.abs(w - center))]), 0.8)
+            np.testing.assert_allclose(equalizer.mid_cutoff, [200 / nyquist, 2000 / nyquist])
+
+    def test_low_sample_rates(self):
+        """Kiểm tra băng tần vượt quá tần số Nyquist không truyền tín hiệu thay vì gây lỗi"""
+        equalizer = ThreeBandEqualizer()
+        equalizer.set_sample_rate(4000)
+        self.assertFalse(np.any(equalizer.filters[2]))
+        w, h = freqz(equalizer.filters[1], worN=8000, fs=4000)
+        self.assertGreater(np.abs(h[np.argmin(np.abs(w - 600))]), 0.8)
+        equalizer.set_gain(2, 6)
+        np.testing.assert_allclose(equalizer.kernel, equalizer.filters[0] + equalizer.filters[1])
+        self.assertEqual(equalizer.process_audio(np.random.uniform(-0.5, 0.5, (4000, 1))).shape, (4000, 1))
+        with self.assertRaises(ValueError):
+            equalizer.set_sample_rate(40)
+        self.assertEqual(equalizer.sample_rate, 4000)
+
+    def test_designs_are_cached(self):
+        """Kiểm tra thiết kế bộ lọc được lưu lại trong bộ nhớ và trên đĩa"""
+        equalizer = ThreeBandEqualizer()
+        equalizer.set_sample_rate(48000)
+        filters = equalizer.filters
+        equalizer.set_sample_rate(44100)
+        hits = design_band_filter.cache_info().hits
+        equalizer.set_sample_rate(48000)
+        self.assertEqual(design_band_filter.cache_info().hits, hits + 3)
+        self.assertTrue(all(a is b for a, b in zip(filters, equalizer.filters)))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            taps = design_band_filter(22050, 63, (200, 2000), 'hamming', cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            design_band_filter.cache_clear()
+            np.testing.assert_array_equal(design_band_filter(22050, 63, (200, 2000), 'hamming', cache_dir), taps)
+
+
+class TestStreamingAudioFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'stereo.wav')
+        self.audio_data = np.random.uniform(-0.5, 0.5, (100000, 2))
+        sf.write(self.filename, self.audio_data, 44100, subtype='FLOAT')
+        self.audio_file = StreamingAudioFile()
+        self.assertTrue(self.audio_file.load_file(self.filename))
+
+    def tearDown(self):
+        self.audio_file.close()
+        self.directory.cleanup()
+
+    def read_all(self, block_size=1000):
+        blocks = []
+        block = np.zeros((block_size, self.audio_file.channels), dtype=np.float32)
+        while True:
+            count = self.audio_file.read_into(block)
+            if count is None:
+                return np.concatenate(blocks) if blocks else np.zeros(0)
+            if count == 0:
+                time.sleep(0.001)
+            blocks.append(block[:count].copy())
+
+    def test_reads_whole_file(self):
+        """Kiểm tra đọc tệp theo khối cho kết quả giống đọc toàn bộ tệp, giữ nguyên số kênh"""
+        self.assertEqual(self.audio_file.frames, len(self.audio_data))
+        self.assertEqual(self.audio_file.channels, 2)
+        np.testing.assert_allclose(self.read_all(), self.audio_data, atol=1e-6)
+
+    def test_seek(self):
+        """Kiểm tra tua đến vị trí bất kỳ qua con trỏ tệp"""
+        block = np.zeros((1000, 2), dtype=np.float32)
+        self.audio_file.read_into(block)
+        self.audio_file.seek(1.0)
+        np.testing.assert_allclose(self.read_all(), self.audio_data[44100:], atol=1e-6)
+
+    def test_save_matches_process_audio(self):
+        """Kiểm tra lưu tệp theo khối giống xử lý toàn bộ tín hiệu"""
+        equalizer = ThreeBandEqualizer()
+        equalizer.player.audio_file.close()
+        equalizer.player.audio_file = self.audio_file
+        equalizer.set_gain(0, 12)
+        output_filename = os.path.join(self.directory.name, 'processed.wav')
+        self.assertTrue(equalizer.save_processed_audio(output_filename))
+        saved, _ = sf.read(output_filename)
+        np.testing.assert_allclose(saved, equalizer.process_audio(self.audio_data), atol=1e-4)
+
+    def test_multichannel_stream(self):
+        """Kiểm tra xử lý nhiều kênh cùng lúc, mỗi kênh có trạng thái bộ lọc riêng"""
+        for num_taps in (101, 2049):
+            equalizer = ThreeBandEqualizer(num_taps=num_taps)
+            equalizer.set_gain(2, -6)
+            frames = equalizer.frame_size
+            blocks = self.audio_data[:40 * frames].reshape(40, frames, 2)
+            output = np.concatenate([equalizer.process_stream(block) for block in blocks])
+            expected = np.clip(lfilter(equalizer.kernel, [1.0], self.audio_data[:40 * frames], axis=0), -1, 1)
+            np.testing.assert_allclose(output, expected, atol=1e-9)
+
+
+class TestCallbackStats(unittest.TestCase):
+    class Flags:
+        def __init__(self, output_underflow=False, output_overflow=False):
+            self.output_underflow = output_underflow
+            self.output_overflow = output_overflow
+
+        def __bool__(self):
+            return self.output_underflow or self.output_overflow
+
+    def test_summary_and_export(self):
+        """Kiểm tra thống kê thời gian callback, số lần xrun và xuất CSV/JSON"""
+        stats = CallbackStats(capacity=8)
+        flags = [None, self.Flags(output_underflow=True), self.Flags(output_overflow=True)]
+        for i in range(10):
+            stats.begin()
+            stats.end(1024, 44100, flags[i % 3])
+        summary = stats.summary()
+        self.assertEqual(summary['callbacks'], 10)
+        self.assertEqual(summary['underflows'], 3)
+        self.assertEqual(summary['overflows'], 3)
+        self.assertAlmostEqual(summary['deadline_ms'], 1024 / 44100 * 1000)
+        self.assertEqual(stats.histogram.sum(), 10)
+        self.assertEqual(len(stats.recent()[0]), 8)
+        with tempfile.TemporaryDirectory() as directory:
+            stats.save(os.path.join(directory, 'stats.csv'))
+            stats.save(os.path.join(directory, 'stats.json'))
+            with open(os.path.join(directory, 'stats.csv')) as f:
+                self.assertEqual(len(f.readlines()), 9)
+            with open(os.path.join(directory, 'stats.json')) as f:
+                self.assertEqual(sum(json.load(f)['histogram']['counts']), 10)
+
+    def test_callback_is_timed(self):
+        """Kiểm tra callback thời gian thực được đo thời gian"""
+        equalizer = ThreeBandEqualizer()
+        equalizer.player.audio_file = AudioFile()
+        equalizer.player.audio_file.audio_data = np.zeros(10 * equalizer.frame_size, dtype=np.float32)
+        equalizer.prepare_stream(equalizer.frame_size)
+        outdata = np.zeros((equalizer.frame_size, 1), dtype=np.float32)
+        for _ in range(5):
+            equalizer.audio_callback(outdata, equalizer.frame_size, None, None)
+        summary = equalizer.callback_stats.summary()
+        self.assertEqual(summary['callbacks'], 5)
+        self.assertGreater(summary['min_headroom_ms'], 0)
+
+
+class TestOctaveBands(unittest.TestCase):
+    def test_band_matrix(self):
+        """Kiểm tra ma trận gộp các bin FFT thành các dải 1/10 quãng tám"""
+        freq = np.fft.rfftfreq(1024, 1 / 44100)
+        matrix, centers = octave_band_matrix(freq, 10)
+        self.assertEqual(len(centers), 100)
+        self.assertEqual(matrix.shape, (100, len(freq)))
+        np.testing.assert_allclose(np.asarray(matrix.sum(axis=1)).ravel(), 1.0)
+        tone = np.sin(2 * np.pi * 3000 * np.arange(1024) / 44100) * np.hanning(1024)
+        levels = matrix @ np.abs(np.fft.rfft(tone)) ** 2
+        self.assertLess(abs(np.log2(centers[np.argmax(levels)] / 3000)), 0.1)
+
+
+class TestBatch(unittest.TestCase):
+    def test_batch_skips_failed_files(self):
+        """Kiểm tra xử lý hàng loạt nhiều tệp, bỏ qua tệp lỗi mà không dừng"""
+        with tempfile.TemporaryDirectory() as directory:
+            audio_data = np.random.uniform(-0.5, 0.5, (20000, 2))
+            for name in ('a.wav', 'b.wav'):
+                sf.write(os.path.join(directory, name), audio_data, 48000)
+            with open(os.path.join(directory, 'broken.wav'), 'wb') as f:
+                f.write(b'not audio')
+            files = find_files([directory])
+            self.assertEqual(len(files), 3)
+            output_dir = os.path.join(directory, 'out')
+            results = run_batch(files, output_dir, (6, 0, -6), workers=2, report=lambda line: None)
+            errors = {os.path.basename(path): error for path, _, _, error in results}
+            self.assertIsNone(errors['a.wav'])
+            self.assertIsNotNone(errors['broken.wav'])
+            equalizer = ThreeBandEqualizer()
+            equalizer.set_sample_rate(48000)
+            equalizer.set_gain(0, 6)
+            equalizer.set_gain(2, -6)
+            saved, sample_rate = sf.read(os.path.join(output_dir, 'b.wav'))
+            self.assertEqual(sample_rate, 48000)
+            np.testing.assert_allclose(saved, equalizer.process_audio(sf.read(files[1])[0]), atol=1e-4)
+
+    def test_output_names_do_not_collide(self):
+        """Kiểm tra tệp trùng tên ở thư mục khác hoặc khác đuôi không ghi đè lên nhau"""
+        with tempfile.TemporaryDirectory() as directory:
+            audio_data = np.random.uniform(-0.5, 0.5, 4000)
+            for name in (os.path.join('a', 'x.wav'), os.path.join('b', 'x.wav'), os.path.join('b', 'x.flac')):
+                os.makedirs(os.path.join(directory, os.path.dirname(name)), exist_ok=True)
+                sf.write(os.path.join(directory, name), audio_data, 8000)
+            inputs = [os.path.join(directory, 'a'), os.path.join(directory, 'b'), os.path.join(directory, '*', '*.wav')]
+            files = find_files(inputs)
+            self.assertEqual(len(files), 3)
+            self.assertEqual(sorted(output_names(files)),
+                             sorted([os.path.join('a', 'x.wav'), os.path.join('b', 'x_flac.wav'),
+                                     os.path.join('b', 'x_wav.wav')]))
+            output_dir = os.path.join(directory, 'out')
+            results = run_batch(files, output_dir, (0, 0, 0), workers=2, report=lambda line: None)
+            self.assertEqual([error for _, _, _, error in results], [None] * 3)
+            written = [os.path.join(root, name) for root, _, names in os.walk(output_dir) for name in names]
+            self.assertEqual(len(written), 3)
+
+
+class TestPartitionedConvolver(unittest.TestCase):
+    def test_matches_direct_convolution(self):
+        """Kiểm tra tích chập phân đoạn cho kết quả giống lfilter với nhiều độ dài bộ lọc"""
+        test_signal = np.random.uniform(-1, 1, 10000)
+        for num_taps in (101, 1024, 1025, 4095):
+            kernel = np.random.uniform(-1, 1, num_taps)
+            convolver = PartitionedConvolver(kernel, 1024)
+            np.testing.assert_allclose(convolver.convolve(test_signal), lfilter(kernel, [1.0], test_signal),
+                                       atol=1e-9)
+
+    def test_long_kernel_equalizer_stream(self):
+        """Kiểm tra bộ cân bằng với bộ lọc dài: xử lý theo khối giống xử lý toàn bộ tín hiệu"""
+        equalizer = ThreeBandEqualizer(num_taps=2049)
+        equalizer.set_gain(0, 6)
+        test_signal = np.random.uniform(-0.1, 0.1, 8 * equalizer.frame_size)
+        streamed = np.concatenate([equalizer.process_stream(block) for block in np.split(test_signal, 8)])
+        np.testing.assert_allclose(streamed, lfilter(equalizer.kernel, [1.0], test_signal), atol=1e-9)
+
+    def test_long_kernel_stream_any_chunk_length(self):
+        """Kiểm tra bộ lọc dài nhận khối dài hơn một khung và khối cuối ngắn hơn"""
+        equalizer = ThreeBandEqualizer(num_taps=2049)
+        frames = equalizer.frame_size
+        test_signal = np.random.uniform(-0.1, 0.1, (3 * frames + 500, 2))
+        chunks = np.split(test_signal, [2 * frames, 3 * frames])
+        streamed = np.concatenate([equalizer.process_stream(chunk) for chunk in chunks])
+        self.assertEqual(streamed.shape, test_signal.shape)
+        np.testing.assert_allclose(streamed, lfilter(equalizer.kernel, [1.0], test_signal, axis=0), atol=1e-9)
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_latest_and_window_reads(self):
+        """Kiểm tra đọc các mẫu mới nhất và một cửa sổ bất kỳ khi bộ đệm quay vòng"""
+        ring = RingBuffer(1000)
+        stream = np.arange(2500, dtype=np.float32)
+        for block in np.split(stream, 10):
+            ring.write(block)
+        np.testing.assert_array_equal(ring.latest(300), stream[-300:])
+        np.testing.assert_array_equal(ring.read(1700, 512), stream[1700:2212])
+        self.assertIsNone(ring.read(1000, 100), "Overwritten samples must not be returned")
+        self.assertIsNone(ring.read(2400, 200), "Samples not written yet must not be returned")
+
+    def test_oversized_write(self):
+        """Kiểm tra ghi một khối lớn hơn dung lượng bộ đệm"""
+        ring = RingBuffer(100)
+        stream = np.arange(250, dtype=np.float32)
+        ring.write(stream)
+        self.assertEqual(ring.write_count, 250)
+        np.testing.assert_array_equal(ring.latest(100), stream[-100:])
+
 
 if __name__ == '__main__':
     unittest.main()
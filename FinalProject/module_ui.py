@@ -2,9 +2,9 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import threading
-import queue
 import time
 import os
+import numpy as np
 from module_filter import ThreeBandEqualizer
 from module_visualizer import AudioVisualizer
 import ttkbootstrap as ttk
@@ -27,7 +27,7 @@ class ThreeBandEqualizerGUI:
         main_frame.grid_rowconfigure(0, weight=1)
         viz_frame = ttk.Frame(main_frame)
         viz_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        self.visualizer = AudioVisualizer(viz_frame, equalizer.sample_rate)
+        self.visualizer = AudioVisualizer(viz_frame, equalizer.sample_rate, equalizer.frame_size, mode='bands')
         controls_frame = ttk.Frame(main_frame)
         controls_frame.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
         controls_frame.grid_rowconfigure(0, weight=0)
@@ -88,6 +88,12 @@ class ThreeBandEqualizerGUI:
         button_frame.pack(side=tk.BOTTOM, pady=15)
         ttk.Button(button_frame, text="Play", command=self.play_audio).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Stop", command=self.stop_audio).pack(side=tk.LEFT, padx=5)
+        stats_frame = ttk.Frame(control_frame)
+        stats_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.stats_label = ttk.Label(stats_frame, text="Callback: -")
+        self.stats_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(stats_frame, text="Export Stats", command=self.export_stats).pack(side=tk.RIGHT, padx=5)
+        self.update_stats()
         self.running = True
         self.update_thread = threading.Thread(target=self.update_visualization)
         self.update_thread.daemon = True
@@ -113,7 +119,8 @@ class ThreeBandEqualizerGUI:
         file_path = file_path.strip('{}')
         self.on_drag_leave(event)
         if file_path.lower().endswith(('.wav', '.mp3', '.ogg')):
-            if self.equalizer.player.load_file(file_path):
+            if self.equalizer.load_file(file_path):
+                self.visualizer.set_sample_rate(self.equalizer.sample_rate)
                 self.file_label.config(text=os.path.basename(file_path))
                 self.audio_duration = self.equalizer.player.audio_file.duration
                 self.duration_label.config(text=self.format_time(self.audio_duration))
@@ -134,14 +141,15 @@ class ThreeBandEqualizerGUI:
         ]
         filename = filedialog.askopenfilename(filetypes=filetypes)
         if filename:
-            if self.equalizer.player.load_file(filename):
+            if self.equalizer.load_file(filename):
+                self.visualizer.set_sample_rate(self.equalizer.sample_rate)
                 self.file_label.config(text=os.path.basename(filename))
                 self.audio_duration = self.equalizer.player.audio_file.duration
                 self.duration_label.config(text=self.format_time(self.audio_duration))
                 self.progress.config(to=self.audio_duration)
 
     def save_file(self):
-        if self.equalizer.player.audio_file.audio_data is None:
+        if not self.equalizer.player.audio_file.is_loaded():
             tk.messagebox.showerror("Error", "No audio file loaded")
             return
         original_ext = os.path.splitext(self.equalizer.player.audio_file.filename)[1]
@@ -159,41 +167,70 @@ class ThreeBandEqualizerGUI:
                 tk.messagebox.showerror("Error", "Failed to save processed audio")
 
     def play_audio(self):
-        if hasattr(self.equalizer.player.audio_file, 'audio_data') and self.equalizer.player.audio_file.audio_data is not None:
+        if self.equalizer.player.audio_file.is_loaded():
+            self.equalizer.prepare_stream(self.equalizer.frame_size, self.equalizer.player.audio_file.channels)
             self.equalizer.player.play(self.equalizer.audio_callback)
             self.update_progress_bar()
 
     def stop_audio(self):
         self.equalizer.player.stop()
-        if hasattr(self.equalizer.player.audio_file, 'current_position'):
-            self.equalizer.player.audio_file.current_position = 0
+        if self.equalizer.player.audio_file.is_loaded():
+            self.equalizer.player.audio_file.seek(0)
         self.progress.set(0)
         self.current_time_label.config(text="00:00")
 
     def seek_audio(self, value):
-        if (hasattr(self.equalizer.player.audio_file, 'audio_data') and 
-            self.equalizer.player.audio_file.audio_data is not None):
+        if self.equalizer.player.audio_file.is_loaded():
             try:
                 position = float(value)
                 self.equalizer.player.audio_file.seek(position)
+                self.equalizer.reset_stream()
                 self.current_time_label.config(text=self.format_time(position))
             except ValueError as e:
                 print(f"Invalid seek position: {e}")
 
     def update_visualization(self):
-        QUEUE_TIMEOUT = 0.1
+        POLL_INTERVAL = 0.01
+        buffer = self.equalizer.visual_buffer
+        window = np.empty(self.equalizer.frame_size, dtype=buffer.buffer.dtype)
+        last_count = buffer.write_count
         while self.running:
             try:
-                audio_data = self.equalizer.audio_queue.get(timeout=QUEUE_TIMEOUT)
-                if audio_data is not None:
-                    self.visualizer.update(audio_data)
-            except queue.Empty:
-                continue
+                if buffer.write_count == last_count:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                last_count = buffer.write_count
+                if buffer.latest(len(window), window) is not None:
+                    self.visualizer.update(window)
             except Exception as e:
                 print(f"Visualization error: {e}")
                 time.sleep(0.1)
         self.visualizer.clear()
 
+    def update_stats(self):
+        STATS_INTERVAL = 500
+        stats = self.equalizer.callback_stats.summary()
+        if stats['callbacks']:
+            underruns = getattr(self.equalizer.player.audio_file, 'underruns', 0)
+            self.stats_label.config(text=(
+                f"Callback: {stats['mean_ms']:.2f} ms avg, {stats['max_ms']:.2f} ms max "
+                f"of {stats['deadline_ms']:.1f} ms, headroom {stats['min_headroom_ms']:.1f} ms | "
+                f"xruns: {stats['underflows']} under, {stats['overflows']} over, "
+                f"{stats['deadline_misses']} late, {underruns} read"))
+        self.root.after(STATS_INTERVAL, self.update_stats)
+
+    def export_stats(self):
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json")],
+            initialfile="callback_stats.csv"
+        )
+        if filename:
+            try:
+                self.equalizer.callback_stats.save(filename)
+            except OSError as e:
+                tk.messagebox.showerror("Error", f"Failed to export stats: {e}")
+
     def update_gain(self, band_idx, value):
         try:
             gain_value = float(value)
@@ -213,12 +250,7 @@ class ThreeBandEqualizerGUI:
     def cleanup(self):
         self.running = False
         self.equalizer.player.stop()
-        if hasattr(self.equalizer, 'audio_queue'):
-            while not self.equalizer.audio_queue.empty():
-                try:
-                    self.equalizer.audio_queue.get_nowait()
-                except queue.Empty:
-                    break
+        self.equalizer.player.audio_file.close()
 
     def update_progress_bar(self):
         def update():
@@ -235,7 +267,7 @@ class ThreeBandEqualizerGUI:
                         self.progress.set(self.current_time)
                         self.current_time_label.config(text=self.format_time(self.current_time))
                         last_position = current_position
-                    if current_position >= len(self.equalizer.player.audio_file.audio_data):
+                    if current_position >= self.equalizer.player.audio_file.frames:
                         self.stop_audio()
                         break
                 else:
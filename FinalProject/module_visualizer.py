@@ -1,33 +1,142 @@
+import time
 import numpy as np
+from scipy import sparse
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import tkinter as tk
 
+
+def octave_band_matrix(freq, bands_per_octave=10, f_min=20.0, f_max=20000.0):
+    # sparse (bands, bins) matrix that averages the power of the FFT bins in
+    # each fractional-octave band between f_min and f_max; bands narrower than
+    # a bin take the bin nearest to their center. Returns it with the centers.
+    f_max = min(f_max, freq[-1])
+    num_bands = int(np.ceil(bands_per_octave * np.log2(f_max / f_min)))
+    edges = f_min * 2.0 ** (np.arange(num_bands + 1) / bands_per_octave)
+    centers = np.sqrt(edges[:-1] * edges[1:])
+    band = np.searchsorted(edges, freq, side='right') - 1
+    inside = (band >= 0) & (band < num_bands)
+    empty = np.setdiff1d(np.arange(num_bands), band[inside])
+    rows = np.concatenate((band[inside], empty))
+    cols = np.concatenate((np.flatnonzero(inside), np.abs(freq - centers[empty, np.newaxis]).argmin(axis=1)))
+    counts = np.bincount(rows, minlength=num_bands)
+    matrix = sparse.csr_matrix((1.0 / counts[rows], (rows, cols)), shape=(num_bands, len(freq)))
+    return matrix, centers
+
+
 class AudioVisualizer:
-    def __init__(self, frame, sample_rate):
+    # Only the lines change from block to block: the axes, ticks and labels
+    # are drawn once into a cached background and every update blits the
+    # lines on top of it. Updates arriving faster than max_fps are dropped.
+    # In 'bands' mode the spectrum is shown as fractional-octave band levels
+    # with exponential smoothing and falling peak markers, in 'fft' mode as
+    # the raw FFT of the block.
+    def __init__(self, frame, sample_rate, frame_size=1024, max_fps=30, blit=True, mode='fft',
+                 bands_per_octave=10, smoothing=0.6, peak_hold=0.5, peak_fall=30.0):
         self.sample_rate = sample_rate
+        self.mode = mode
+        self.bands_per_octave = bands_per_octave
+        self.smoothing = smoothing
+        # peaks are held for peak_hold seconds, then fall by peak_fall dB per second
+        self.peak_hold_frames = int(round(peak_hold * min(max_fps, 1000)))
+        self.peak_decay = peak_fall / min(max_fps, 1000)
+        self.min_interval = 1.0 / max_fps
+        self.last_draw = 0.0
         self.fig = Figure(figsize=(8, 4))
         self.ax_wave = self.fig.add_subplot(211)
         self.ax_wave.set_title('Waveform')
         self.ax_wave.set_ylim(-1, 1)
-        self.ax_wave.set_xlim(0, 1024)
-        self.wave_line, = self.ax_wave.plot([], [], 'b-', lw=1)
+        self.ax_wave.set_xlim(0, frame_size)
+        self.wave_line, = self.ax_wave.plot([], [], 'b-', lw=1, animated=blit)
         self.ax_spectrum = self.fig.add_subplot(212)
         self.ax_spectrum.set_title('Frequency Spectrum')
         self.ax_spectrum.set_ylim(-60, 60)
         self.ax_spectrum.set_xlim(20, 20000)
         self.ax_spectrum.set_xscale('log')
-        self.spectrum_line, = self.ax_spectrum.plot([], [], 'g-', lw=1)
+        self.spectrum_line, = self.ax_spectrum.plot([], [], 'g-', lw=1, animated=blit)
+        self.peak_line, = self.ax_spectrum.plot([], [], 'r_', ms=4, animated=blit)
         self.canvas = FigureCanvasTkAgg(self.fig, master=frame)
+        self.blit = blit and self.canvas.supports_blit
+        self.background = None
+        # the background is grabbed again after every full redraw (e.g. a resize)
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.set_frame_size(frame_size)
         self.canvas.draw()
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
         self.fig.tight_layout()
-        
+
+    def set_frame_size(self, frame_size):
+        # axes and window for blocks of frame_size samples, computed once
+        self.frame_size = frame_size
+        self.window = np.hanning(frame_size)
+        # so a full scale sine shows at the same level as without the window
+        self.window /= self.window.mean()
+        self.freq = np.fft.rfftfreq(frame_size, 1 / self.sample_rate)
+        self.wave_line.set_data(np.arange(frame_size), np.zeros(frame_size))
+        if self.mode == 'bands':
+            self.band_matrix, self.band_centers = octave_band_matrix(self.freq, self.bands_per_octave)
+            self.spectrum_line.set_data(self.band_centers, np.full(len(self.band_centers), -200.0))
+            self.peak_line.set_data(self.band_centers, np.full(len(self.band_centers), -200.0))
+        else:
+            self.spectrum_line.set_data(self.freq, np.full(len(self.freq), -200.0))
+            self.peak_line.set_data([], [])
+        # smoothed band levels and peaks start from the next block
+        self.levels = None
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.set_frame_size(self.frame_size)
+
+    def on_draw(self, event):
+        if self.blit:
+            self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+            self.draw_lines()
+
+    def draw_lines(self):
+        self.ax_wave.draw_artist(self.wave_line)
+        self.ax_spectrum.draw_artist(self.spectrum_line)
+        self.ax_spectrum.draw_artist(self.peak_line)
+
     def update(self, audio_data):
-        self.wave_line.set_data(np.arange(len(audio_data)), audio_data)
-        spectrum = np.fft.rfft(audio_data)
-        freq = np.fft.rfftfreq(len(audio_data), 1/self.sample_rate)
-        spectrum_db = 20 * np.log10(np.abs(spectrum) + 1e-10)
-        self.spectrum_line.set_data(freq, spectrum_db)
-        self.canvas.draw()
\ No newline at end of file
+        # returns False when the update was dropped by the frame rate cap
+        now = time.perf_counter()
+        if now - self.last_draw < self.min_interval:
+            return False
+        self.last_draw = now
+        if len(audio_data) != self.frame_size:
+            self.set_frame_size(len(audio_data))
+        self.wave_line.set_ydata(audio_data)
+        spectrum = np.fft.rfft(audio_data * self.window)
+        if self.mode == 'bands':
+            self.update_bands(spectrum)
+            self.spectrum_line.set_ydata(self.levels)
+            self.peak_line.set_ydata(self.peaks)
+        else:
+            spectrum_db = 20 * np.log10(np.abs(spectrum) + 1e-10)
+            self.spectrum_line.set_ydata(spectrum_db)
+        if self.blit and self.background is not None:
+            self.canvas.restore_region(self.background)
+            self.draw_lines()
+            self.canvas.blit(self.fig.bbox)
+        else:
+            self.canvas.draw_idle()
+        return True
+
+    def update_bands(self, spectrum):
+        power = self.band_matrix @ (spectrum.real ** 2 + spectrum.imag ** 2)
+        levels = 10 * np.log10(power + 1e-20)
+        if self.levels is None:
+            self.levels = levels
+            self.peaks = levels.copy()
+            self.hold = np.full(len(levels), self.peak_hold_frames)
+            return
+        self.levels = self.smoothing * self.levels + (1 - self.smoothing) * levels
+        rising = self.levels >= self.peaks
+        falling = np.maximum(self.peaks - self.peak_decay, self.levels)
+        self.peaks = np.where(rising, self.levels, np.where(self.hold > 0, self.peaks, falling))
+        self.hold = np.where(rising, self.peak_hold_frames, np.maximum(self.hold - 1, 0))
+
+    def clear(self):
+        self.set_frame_size(self.frame_size)
+        self.canvas.draw_idle()
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+
+# the sub projects import their modules by plain name, as when run from their folders
+root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(root, 'FinalProject'))
+sys.path.append(os.path.join(root, 'ASM2-NguyenNgocThao'))
+
+from processfunc import processFrequencyBand
+from module_filter import ThreeBandEqualizer
+from apply_filter import apply_filter, apply_filters
+from filters.low_pass_filters import ideal_lowpass_filter, gaussian_lowpass_filter, butterworth_lowpass_filter
+from filters.high_pass_filters import ideal_highpass_filter, gaussian_highpass_filter, butterworth_highpass_filter
+from filters.notch_filter import notch_filter
+from filters.frequency_grid import _cached_distance_grid
+
+fs = 44100
+
+
+def audioCases(seconds):
+    rng = np.random.default_rng(0)
+    data = rng.integers(-2**15, 2**15, int(seconds * fs)).astype(np.int16)
+    audio = rng.uniform(-0.5, 0.5, int(seconds * fs))
+    factors = np.linspace(0, 5, 10)
+    equalizer = ThreeBandEqualizer()
+    equalizer.set_gain(0, 6)
+    blocks = [audio[start:start + equalizer.frame_size]
+              for start in range(0, len(audio) - equalizer.frame_size + 1, equalizer.frame_size)]
+
+    def perBlock():
+        equalizer.reset_stream()
+        for block in blocks:
+            equalizer.process_stream(block)
+
+    params = {'seconds': seconds, 'fs': fs}
+    yield 'processFrequencyBand', params, lambda: processFrequencyBand(data, fs, factors)
+    yield 'process_audio.whole', params, lambda: equalizer.process_audio(audio)
+    yield 'process_audio.blocks', dict(params, frame_size=equalizer.frame_size), perBlock
+
+
+def imageCases(size):
+    shape = (size, size)
+    image = np.random.default_rng(0).uniform(0, 255, shape)
+    cutoff = size / 8
+    mask = gaussian_lowpass_filter(shape, cutoff)
+    params = {'size': size, 'cutoff': cutoff}
+    maskCases = [
+        ('ideal_lowpass_filter', params, lambda: ideal_lowpass_filter(shape, cutoff)),
+        ('gaussian_lowpass_filter', params, lambda: gaussian_lowpass_filter(shape, cutoff)),
+        ('butterworth_lowpass_filter', params, lambda: butterworth_lowpass_filter(shape, cutoff)),
+        ('ideal_highpass_filter', params, lambda: ideal_highpass_filter(shape, cutoff)),
+        ('gaussian_highpass_filter', params, lambda: gaussian_highpass_filter(shape, cutoff)),
+        ('butterworth_highpass_filter', params, lambda: butterworth_highpass_filter(shape, cutoff)),
+        ('notch_filter', {'size': size, 'cutoff': cutoff / 4}, lambda: notch_filter(shape, cutoff / 4, size // 8, size // 8)),
+    ]
+    for name, maskParams, function in maskCases:
+        # the distance grid is cached per shape, so without clearing it every
+        # timed call after measure's warm-up would skip building it
+        yield name, maskParams, lambda function=function: (_cached_distance_grid.cache_clear(), function())
+        yield name, dict(maskParams, cache='warm'), function
+    halfMask = gaussian_lowpass_filter(shape, cutoff, half=True)
+    yield 'apply_filter', {'size': size}, lambda: apply_filter(image, mask)
+    yield 'apply_filter.half', {'size': size}, lambda: apply_filter(image, halfMask)
+    yield 'apply_filter.half', {'size': size, 'precision': 'single'}, lambda: apply_filter(image, halfMask, 'single')
+    halfMasks = np.stack([gaussian_lowpass_filter(shape, size / divisor, half=True) for divisor in range(2, 18)])
+    yield 'apply_filter.sweep', {'size': size, 'masks': len(halfMasks)}, lambda: [apply_filter(image, m) for m in halfMasks]
+    yield 'apply_filters.sweep', {'size': size, 'masks': len(halfMasks)}, lambda: apply_filters(image, halfMasks)
+
+
+def visualizerCases(frames):
+    # AudioVisualizer draws into a Tk window, so this needs a display
+    import tkinter as tk
+    from module_visualizer import AudioVisualizer
+    try:
+        window = tk.Tk()
+    except tk.TclError as e:
+        print("skipping AudioVisualizer.update: {}".format(e))
+        return
+    window.withdraw()
+    data = np.random.default_rng(0).uniform(-0.5, 0.5, frames).astype(np.float32)
+    for mode in ('fft', 'bands'):
+        # no frame rate cap, so every call draws
+        visualizer = AudioVisualizer(window, fs, frames, max_fps=float('inf'), mode=mode)
+        yield 'AudioVisualizer.update', {'frames': frames, 'mode': mode}, lambda visualizer=visualizer: visualizer.update(data)
+
+
+def allCases(lengths, sizes, frames):
+    for seconds in lengths:
+        yield from audioCases(seconds)
+    for size in sizes:
+        yield from imageCases(size)
+    yield from visualizerCases(frames)
+
+
+def caseName(name, params):
+    return name + '[' + ','.join('{}={}'.format(key, value) for key, value in sorted(params.items())) + ']'
+
+
+def measure(function, repeat, minTime):
+    # one warm-up call, then at least repeat calls and minTime seconds
+    function()
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - start < minTime:
+        begin = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - begin)
+    return {'min': min(times), 'median': float(np.median(times)), 'runs': len(times)}
+
+
+def compare(results, baseline, threshold):
+    # names of the cases whose best time grew by more than threshold (0.2 = 20%)
+    slower = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['min'] / baseline[name]['min']
+        flag = ''
+        if ratio > 1 + threshold:
+            slower.append(name)
+            flag = '  SLOWER'
+        print("{:70s} {:10.5f} s {:6.2f}x of baseline{}".format(name, result['min'], ratio, flag))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DSP hot paths of the repository")
+    parser.add_argument('--lengths', type=float, nargs='+', default=[1, 10], help="signal lengths in seconds")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[128, 256], help="square image sizes in pixels")
+    parser.add_argument('--frames', type=int, default=1024, help="block size shown by the visualizer")
+    parser.add_argument('--filter', default='', help="only run cases whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case, at least")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds spent on each case, at least")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON file of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, params, function in allCases(args.lengths, args.sizes, args.frames):
+        name = caseName(name, params)
+        if args.filter not in name:
+            continue
+        results[name] = dict(measure(function, args.repeat, args.min_time), params=params)
+        print("{:70s} {:10.5f} s (median {:.5f} s, {} runs)".format(
+            name, results[name]['min'], results[name]['median'], results[name]['runs']))
+
+    report = {
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__,
+                    'platform': platform.platform(), 'processor': platform.processor()},
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        print()
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print("{} case(s) slower than the baseline by more than {:.0%}".format(len(slower), args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
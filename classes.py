@@ -3,39 +3,111 @@ import pyqtgraph as pg
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.io.wavfile import write
-import winsound
-import math
+import threading
+from playback import Player
+from processfunc import SpectrogramTiles
 
 midColor = [(0, 182, 188, 255), (128, 128, 128, 255),  (0, 128, 128, 255), (230,0,115, 255), (204, 0, 0, 255)]
 maxColor = [(246, 111, 0, 255), (0, 0, 0, 255), (230, 230, 0, 255), (0,0,0, 255), (0, 0, 0, 255)]
 minColor = [(75, 0, 113, 255), (255, 255, 255, 255), (102, 0, 34, 255), (255,255,255, 255), (255,255,255, 255)]
 
+class TimeAxis(object):
+    # time of each sample, computed from its index when it is read instead of
+    # being stored as one float64 per sample
+    def __init__(self, length, fs):
+        self.length = length
+        self.fs = fs
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return np.arange(*idx.indices(self.length)) / self.fs
+        idx = np.asarray(idx)
+        if np.any(idx >= self.length) or np.any(idx < -self.length):
+            raise IndexError("sample index out of range")
+        return (np.where(idx < 0, idx + self.length, idx) / self.fs)[()]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.arange(self.length, dtype=dtype) / self.fs
+
+class MinMaxPyramid(object):
+    # min and max of the signal over blocks of factor, factor**2, ... samples,
+    # so any range can be drawn with about as many points as it has pixels
+    factor = 4
+
+    def __init__(self, data):
+        self.data = data
+        self.levels = []
+        blockSize = self.__class__.factor
+        mins = maxs = data
+        while len(mins) > 1:
+            starts = np.arange(0, len(mins), self.__class__.factor)
+            mins = np.minimum.reduceat(mins, starts)
+            maxs = np.maximum.reduceat(maxs, starts)
+            self.levels.append((blockSize, mins, maxs))
+            blockSize = blockSize * self.__class__.factor
+
+    def envelope(self, start, stop, points):
+        # sample positions and values to draw data[start:stop] on about `points` pixels
+        start = max(start, 0)
+        stop = min(stop, len(self.data))
+        level = None
+        for blockSize, mins, maxs in self.levels:
+            if blockSize > (stop - start) / max(points, 1):
+                break
+            level = (blockSize, mins, maxs)
+        if level is None:
+            return np.arange(start, stop), self.data[start:stop]
+        blockSize, mins, maxs = level
+        first = start // blockSize
+        last = -(-stop // blockSize)
+        # a vertical stroke from min to max per block keeps every peak visible
+        positions = np.repeat(np.arange(first, last) * blockSize, 2)
+        values = np.empty((2 * (last - first),), dtype=mins.dtype)
+        values[0::2] = mins[first:last]
+        values[1::2] = maxs[first:last]
+        return positions, values
+
 class signal(object):
     timer = QtCore.QTimer()
+    # one player for all viewers: like before, the signal listened to last is heard
+    player = Player()
     speedFactor = 3000
 
     def __init__(self, data, fs, widget, winNumber):
-        self.amplitude = np.int32((data))
+        # kept as given, so viewers opened on the same (memory mapped) data share it
+        self.amplitude = data
+        # equalized outputs are on the scale of this type, see EqualizerWorker.outputPyramid
+        self.sampleType = data.dtype
         self.fs = fs
         self.fmax = fs/2
         self.maxAmplitude = self.amplitude.max()
         self.minAmplitude = self.amplitude.min()
         self.zoomFactor = 1
         self.__class__.speedFactor = fs/10
-        self.time = np.linspace(0., len(data)/fs, len(data))
+        self.time = TimeAxis(len(data), fs)
         self.startTimeIdx = 0
         self.endTimeIdx = int(fs * self.zoomFactor) - 1
         self.__class__.timer.setInterval(200) # m     interval
         self.widget = widget
         self.winNumber = winNumber
+        self.pyramid = MinMaxPyramid(self.amplitude)
+        # stays on the data given here: the equalized spectrogram is this one
+        # with the band gains applied, see setGains
+        self.spectrogram = SpectrogramTiles(self.amplitude, fs)
+        self.curve = None
+        self.widget.sigXRangeChanged.connect(self.redraw)
         self.plot()
         self.listen()
 
-    def updateSignal(self, data):
-        self.amplitude = np.int32((data))
-        self.time = np.linspace(0., len(data)/self.fs, len(data))
+    def updateSignal(self, pyramid):
+        # pyramid of the new samples, built off the GUI thread by EqualizerWorker
+        self.amplitude = pyramid.data
+        self.time = TimeAxis(len(self.amplitude), self.fs)
+        self.pyramid = pyramid
         self.plot()
-        self.save()
         self.listen()
 
     def plot(self):
@@ -45,7 +117,16 @@ class signal(object):
         self.widget.setYRange(self.minAmplitude * self.zoomFactor , self.maxAmplitude * self.zoomFactor)
         self.pen = pg.mkPen(color=(255, 0, 0))
         self.widget.clear()
-        self.widget.plot(self.time, self.amplitude, pen=self.pen)
+        self.curve = self.widget.plot(pen=self.pen)
+        self.redraw()
+
+    def redraw(self, *args):
+        # draw only the visible part of the signal, at about screen resolution
+        if self.curve is None:
+            return
+        xmin, xmax = self.widget.viewRange()[0]
+        positions, values = self.pyramid.envelope(int(xmin * self.fs), int(xmax * self.fs) + 2, self.widget.width())
+        self.curve.setData(positions / self.fs, values)
 
     def moveGraph(self):
         if len(self.time) - int(self.fs * self.zoomFactor):
@@ -90,19 +171,31 @@ class signal(object):
         return fig
 
     def initSpectrogram(self, imageItem, hist):
-        # Scale the X and Y Axis to time and frequency (standard is pixels)
-        imageItem.scale(self.time[-1]/np.size(self.powerSpectrum, axis=1), math.pi/np.size(self.powerSpectrum, axis=0))
         self.setSpectrogramColor(hist, 0)
 
     def setSpectrogramColor(self, hist, slidervalue): # slidervalue -> 0: 4
         hist.gradient.restoreState({'mode': 'rgb','ticks': [(0.5, midColor[slidervalue]),(1.0, maxColor[slidervalue]),(0.0, minColor[slidervalue])]})
         hist.gradient.saveState()
 
+    def spectrogramFrames(self):
+        # spectrogram frames under the visible part of the signal
+        hop = self.spectrogram.hop
+        startFrame = min(self.startTimeIdx // hop, self.spectrogram.frameCount - 1)
+        return startFrame, self.endTimeIdx // hop + 1
+
     def plotSpectrogram(self, imageItem):
-        self.powerSpectrum, self.freqenciesFound, _, _ = plt.specgram(self.amplitude, Fs=self.fs)
+        startFrame, stopFrame = self.spectrogramFrames()
+        self.showSpectrogram(imageItem, self.spectrogram.power(startFrame, stopFrame), startFrame)
+
+    def showSpectrogram(self, imageItem, powerSpectrum, startFrame):
+        hop = self.spectrogram.hop
+        self.powerSpectrum = powerSpectrum
+        self.freqenciesFound = self.spectrogram.frequencies
         # for more colormaps: https://matplotlib.org/2.0.2/examples/color/colormaps_reference.html
         # Sxx contains the amplitude for each pixel
         imageItem.setImage(self.powerSpectrum)
+        # Scale the X and Y Axis to time and frequency (standard is pixels)
+        imageItem.setRect(QtCore.QRectF(startFrame * hop / self.fs, 0, np.size(self.powerSpectrum, axis=1) * hop / self.fs, self.fmax))
 
     def moveSpectrogram(self, minIntensity, maxIntensity, plotItem, hist):
         # Fit the min and max levels of the histogram to the data available
@@ -112,6 +205,74 @@ class signal(object):
         # plotItem.setXRange(self.time[self.startTimeIdx], self.time[self.endTimeIdx])
 
     def listen(self):
-        winsound.PlaySound("output_sound" + str(self.winNumber) + ".wav", winsound.SND_ASYNC)
+        self.__class__.player.play(self.amplitude, self.fs, self.sampleType)
+
     def save(self):
         write("output_sound" + str(self.winNumber) + ".wav", self.fs, self.amplitude.astype(np.int16))
+
+class EqualizerWorker(QtCore.QThread):
+    # Equalizes and computes the output spectrogram off the GUI thread.
+    # Requests are coalesced: a new one replaces any request still waiting,
+    # and a job that is superseded while running stops at its next step and
+    # is never delivered. The output is delivered as the MinMaxPyramid the
+    # viewer draws from, so the GUI thread only has to plot it.
+    resultReady = QtCore.pyqtSignal(int, object, object, object, int) # generation, factors, pyramid, powerSpectrum, startFrame
+
+    def __init__(self, equalizer, spectrogram, sampleType):
+        super(EqualizerWorker, self).__init__()
+        self.equalizer = equalizer
+        self.spectrogram = spectrogram
+        self.sampleType = np.dtype(sampleType)
+        self.output = None
+        self.pyramid = None
+        self.condition = threading.Condition()
+        self.pending = None
+        self.generation = 0
+        self.running = True
+
+    def submit(self, factors, startFrame, stopFrame):
+        with self.condition:
+            self.generation = self.generation + 1
+            self.pending = (self.generation, np.array(factors, dtype=float), startFrame, stopFrame)
+            self.condition.notify()
+            return self.generation
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def superseded(self, generation):
+        return generation != self.generation or not self.running
+
+    def outputPyramid(self, output):
+        # the equalizer returns the same array while the gains do not change,
+        # e.g. for spectrogram scrolling, so its pyramid is built once
+        if output is not self.output:
+            # integer files are shown and played as int32 on the scale of their
+            # type (see signal.listen), float files keep their float samples
+            if np.issubdtype(self.sampleType, np.integer):
+                samples = np.int32(output)
+            else:
+                samples = output
+            self.pyramid = MinMaxPyramid(samples)
+            self.output = output
+        return self.pyramid
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation, factors, startFrame, stopFrame = self.pending
+                self.pending = None
+            pyramid = self.outputPyramid(self.equalizer.equalize(factors))
+            if self.superseded(generation):
+                continue
+            self.spectrogram.setGains(factors)
+            powerSpectrum = self.spectrogram.power(startFrame, stopFrame)
+            if self.superseded(generation):
+                continue
+            self.resultReady.emit(generation, factors, pyramid, powerSpectrum, min(startFrame, self.spectrogram.frameCount - 1))
@@ -19,10 +19,9 @@ from matplotlib.backends.backend_pdf import PdfPages
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy 
-from classes import signal
-from scipy.io import wavfile
+from classes import signal, EqualizerWorker
 import pathlib
-from processfunc import processFrequencyBand
+from processfunc import BandEqualizer, readWav
 
 cmaps = ['plasma', 'Greys', 'viridis', 'magma', 'inferno']
 
@@ -42,6 +41,9 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.ui.pallet.activated[str].connect(self.setSpectrogramColor)
         self.inputSignal = False
         self.outputSignal = False
+        self.equalizer = False
+        self.worker = False
+        self.latestRequest = 0
         signal.timer.start()
         self.ui.open.triggered.connect(self.open)
         self.ui.save.triggered.connect(self.saveAs)
@@ -58,24 +60,29 @@ class ApplicationWindow(QtWidgets.QMainWindow):
     def __del__(self):
         self.__class__.windowsNumber = self.__class__.windowsNumber - 1
 
+    def closeEvent(self, event):
+        if self.worker:
+            self.worker.stop()
+            self.worker.wait()
+        super(ApplicationWindow, self).closeEvent(event)
+
     def zoomOut(self):
         if self.inputSignal and self.outputSignal:
             self.inputSignal.zoomOut()
             self.outputSignal.zoomOut()
-            self.outputSignal.moveSpectrogram(self.min_intensity, self.max_intensity, self.ui.SpectrogramPlotItem, self.ui.hist)
+            self.requestResult()
 
     def zoomIn(self):
         if self.inputSignal and self.outputSignal:
             self.inputSignal.zoomIn()
             self.outputSignal.zoomIn()
-            self.outputSignal.moveSpectrogram(self.min_intensity, self.max_intensity, self.ui.SpectrogramPlotItem, self.ui.hist)
+            self.requestResult()
 
     def scrollView(self):
         slidervalue = self.ui.scroll.value()
         self.inputSignal.scrollSignal(slidervalue)
         self.outputSignal.scrollSignal(slidervalue)
-        self.outputSignal.plotSpectrogram(self.ui.output_spectrogram)
-        self.outputSignal.moveSpectrogram(self.min_intensity, self.max_intensity, self.ui.SpectrogramPlotItem, self.ui.hist)
+        self.requestResult()
 
     def equalizeSignal(self):
         if self.inputSignal and self.outputSignal:
@@ -83,9 +90,22 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             for slider in self.ui.sliders:
                 self.slidervalues[idx] = slider.value()/ 20
                 idx = idx + 1
-            self.outputSignal.updateSignal(processFrequencyBand(self.inputSignal.amplitude, self.inputSignal.fs,self.slidervalues))
-            self.outputSignal.plotSpectrogram(self.ui.output_spectrogram)
-            self.outputSignal.moveSpectrogram(self.min_intensity, self.max_intensity, self.ui.SpectrogramPlotItem, self.ui.hist)
+            self.requestResult()
+
+    def requestResult(self):
+        # equalization and the spectrogram are computed by the worker thread;
+        # results of any request made before this one are ignored
+        startFrame, stopFrame = self.outputSignal.spectrogramFrames()
+        self.latestRequest = self.worker.submit(self.slidervalues, startFrame, stopFrame)
+
+    def showResult(self, generation, factors, pyramid, powerSpectrum, startFrame):
+        if generation != self.latestRequest:
+            return
+        if not np.array_equal(factors, self.shownFactors):
+            self.outputSignal.updateSignal(pyramid)
+            self.shownFactors = factors
+        self.outputSignal.showSpectrogram(self.ui.output_spectrogram, powerSpectrum, startFrame)
+        self.outputSignal.moveSpectrogram(self.min_intensity, self.max_intensity, self.ui.SpectrogramPlotItem, self.ui.hist)
 
     def adjustSpectrogram(self):
         if self.inputSignal and self.outputSignal:
@@ -102,9 +122,15 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             path = files_name[0]
 
             if pathlib.Path(path).suffix == ".wav":
-                samplerate, data = wavfile.read(path)
+                # both viewers and the equalizer share this read-only buffer
+                samplerate, data = readWav(path)
                 self.inputSignal = signal(data, samplerate, self.ui.input_signal, self.__class__.windowsNumber)
                 self.outputSignal = signal(data, samplerate, self.ui.output_signal, self.__class__.windowsNumber)   
+                self.equalizer = BandEqualizer(data, samplerate, len(self.ui.sliders))
+                self.shownFactors = np.ones((len(self.ui.sliders),), dtype=float)
+                self.worker = EqualizerWorker(self.equalizer, self.outputSignal.spectrogram, data.dtype)
+                self.worker.resultReady.connect(self.showResult)
+                self.worker.start()
                 self.max_intensity = (self.ui.max_slider.value()/1000)
                 self.min_intensity = (self.ui.min_slider.value()/1000)
                 self.outputSignal.plotSpectrogram(self.ui.output_spectrogram)
@@ -115,8 +141,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         if self.inputSignal:
             self.inputSignal.moveGraph()
             self.outputSignal.moveGraph()
-            self.outputSignal.plotSpectrogram(self.ui.output_spectrogram)
-            self.outputSignal.moveSpectrogram(self.min_intensity, self.max_intensity, self.ui.SpectrogramPlotItem, self.ui.hist)
+            self.requestResult()
 
     def saveAs(self):
         if self.inputSignal and self.outputSignal:
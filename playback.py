@@ -0,0 +1,137 @@
+import numpy as np
+from processfunc import int16Scale
+
+try:
+    import sounddevice
+except (ImportError, OSError):
+    # not installed, or no PortAudio library on this machine
+    sounddevice = None
+
+
+class NullBackend(object):
+    # plays nothing; the player can still be used on machines without audio
+    def start(self, player):
+        pass
+
+    def stop(self):
+        pass
+
+
+class CaptureBackend(NullBackend):
+    # keeps everything the player renders, blocks are pulled by hand (e.g. in tests)
+    def __init__(self):
+        self.player = None
+        self.blocks = []
+
+    def start(self, player):
+        self.player = player
+
+    def stop(self):
+        self.player = None
+
+    def pull(self, frames):
+        block = np.zeros((frames, self.player.channels), dtype=np.float32)
+        more = self.player.render(block)
+        self.blocks.append(block)
+        if not more:
+            # like the sounddevice stream, stop pulling once the buffer has ended
+            self.stop()
+        return block
+
+    def captured(self):
+        if not self.blocks:
+            return np.zeros((0, 1), dtype=np.float32)
+        return np.concatenate(self.blocks)
+
+
+class SoundDeviceBackend(object):
+    # plays through the default output device of sounddevice
+    def __init__(self, blocksize=1024):
+        self.blocksize = blocksize
+        self.stream = None
+
+    def start(self, player):
+        def callback(outdata, frames, time, status):
+            if not player.render(outdata):
+                # the stream plays this last block and then goes inactive;
+                # it is closed by the next stop()
+                raise sounddevice.CallbackStop
+
+        self.stream = sounddevice.OutputStream(
+            samplerate=player.fs,
+            channels=player.channels,
+            dtype='float32',
+            blocksize=self.blocksize,
+            callback=callback
+        )
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+def defaultBackend():
+    if sounddevice is None:
+        return NullBackend()
+    return SoundDeviceBackend()
+
+
+class Player(object):
+    # Plays a NumPy buffer straight from memory. The backend pulls blocks
+    # through render(); play() swaps in a new buffer and, when it has the same
+    # shape as the one playing, carries on from the current position. At the
+    # end of the buffer playback stops and the next play() starts from 0.
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else defaultBackend()
+        self.source = None
+        self.fs = None
+        self.channels = 1
+        self.position = 0
+        self.playing = False
+
+    def play(self, data, fs, sampleType=None):
+        # sampleType is the wav dtype whose full scale the samples are in, by
+        # default their own; e.g. int16 for equalized int16 audio held as int32
+        data = np.asarray(data)
+        samples = data.reshape((len(data), -1))
+        # samples are scaled to [-1, 1) block by block while rendering
+        offset, gain = int16Scale(data.dtype if sampleType is None else sampleType)
+        scale = gain / 2**15
+        restart = not self.playing or fs != self.fs or samples.shape[1] != self.channels
+        if restart or samples.shape != self.source[0].shape:
+            self.position = 0
+        # one assignment, so render() never sees a half swapped buffer
+        self.source = (samples, offset, scale)
+        if restart:
+            self.backend.stop()
+            self.fs = fs
+            self.channels = samples.shape[1]
+            self.backend.start(self)
+            self.playing = True
+
+    def stop(self):
+        self.backend.stop()
+        self.playing = False
+        self.position = 0
+
+    def render(self, outdata):
+        # fills outdata (frames, channels) with the next block, zeros after the end;
+        # returns False once the end is reached so the backend stops pulling
+        samples, offset, scale = self.source
+        position = self.position
+        frames = max(min(len(outdata), len(samples) - position), 0)
+        # converted to float in outdata first, so unsigned samples cannot wrap
+        outdata[:frames] = samples[position:position + frames]
+        outdata[:frames] -= offset
+        outdata[:frames] *= scale
+        # gains above 1 can push the equalized signal past full scale
+        np.clip(outdata[:frames], -1, 1, out=outdata[:frames])
+        outdata[frames:] = 0
+        self.position = position + frames
+        if self.position >= len(samples):
+            self.playing = False
+            return False
+        return True
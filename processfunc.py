@@ -1,9 +1,219 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.fft import rfft, rfftfreq, irfft
+from scipy.signal import get_window
+from scipy.io import wavfile
+from functools import lru_cache
+from collections import OrderedDict
+import threading
 import cmath
+import time
+import wave
+
+@lru_cache(maxsize=8)
+def bandIndexMap(N, fs, bandCount):
+    # For every rfft bin, the index of its gain in the table built by bandGains:
+    # 0 .. bandCount-1 -> gain of that band
+    # bandCount        -> outside every band, kept as is
+    # bandCount + 1    -> never written back by the original loops, so zeroed
+    frequencies = rfftfreq(N, 1 / fs)
+    points_per_freq = len(frequencies) / (fs / 2)
+    # the original loops address bins through int(points_per_freq * f), which
+    # is not exactly the bin of f; keep that addressing so the output matches
+    f_idx = (points_per_freq * frequencies).astype(np.intp)
+
+    bandMap = np.full((len(frequencies),), bandCount + 1, dtype=np.intp)
+    bandMap[f_idx[f_idx < len(frequencies)]] = bandCount
+    for idx in range(bandCount):
+        low = ((fs / 2)/bandCount) * idx
+        high = (((fs / 2)/bandCount) * (idx + 1)) - 1
+        bandMap[f_idx[(low < frequencies) & (frequencies < high)]] = idx
+    bandMap.setflags(write=False)
+    return bandMap
+
+def bandGains(bandMap, factors):
+    # per-bin gain vector for the bins described by bandMap
+    table = np.empty((len(factors) + 2,), dtype=float)
+    table[:len(factors)] = factors
+    table[len(factors)] = 1
+    table[len(factors) + 1] = 0
+    return table[bandMap]
 
 def processFrequencyBand(data, fs,factors):
+    bandMap = bandIndexMap(len(data), fs, len(factors))
+    # scaling a complex coefficient keeps its phase, so the gains are applied
+    # directly instead of going through amplitudes and phases
+    return irfft(rfft(data) * bandGains(bandMap, factors))
+
+class BandEqualizer(object):
+    # the input never changes, so its spectrum is computed once per file and
+    # every equalization is one multiply and one irfft
+    def __init__(self, data, fs, bandCount):
+        self.fs = fs
+        self.spectrum = rfft(data)
+        self.bandMap = bandIndexMap(len(data), fs, bandCount)
+        self.factors = None
+        self.output = None
+
+    def equalize(self, factors):
+        factors = np.array(factors, dtype=float)
+        if self.output is None or not np.array_equal(factors, self.factors):
+            # a new array, so outputs handed out earlier never change
+            self.output = irfft(self.spectrum * bandGains(self.bandMap, factors))
+            self.factors = factors
+        return self.output
+
+def equalizeStream(data, fs, factors, frameSize=8192):
+    # Block based version of processFrequencyBand: short-time spectra of
+    # hann windowed frames with 50% overlap are scaled by the same band gains
+    # and overlap-added, so only one frame is held in memory at a time.
+    # data only has to support len() and slicing (e.g. a memory mapped wav)
+    # and the equalized signal is yielded in blocks of frameSize // 2 samples.
+    #
+    # With unit gains the output equals the input. Otherwise it follows the
+    # whole-file result within 4% relative RMS error for broadband audio at
+    # the default frameSize, for any gains and every channel alike; typical
+    # settings stay around 2%, and the worst case is neighbouring bands
+    # switched between 0 and 1 (checked in testProcessfunc.py, on even lengths:
+    # for odd ones the whole-file irfft is one sample short). The difference
+    # comes from the coarser frequency resolution (fs / frameSize) at the band
+    # edges, so pure tones within a few bins of an edge can deviate more.
+    # Larger frames get closer.
+    if frameSize < 2 or frameSize % 2:
+        # the hann frames only add up to a constant at 50% overlap of an even size
+        raise ValueError("frameSize must be a positive even number, got {}".format(frameSize))
+    hop = frameSize // 2
+    window = get_window('hann', frameSize)
+    # the frame size bins dropped by the original addressing (see bandIndexMap)
+    # would cost ~1/sqrt(frameSize) of the signal per frame, so they are passed through
+    gains = bandGains(np.minimum(bandIndexMap(frameSize, fs, len(factors)), len(factors)), factors)
+
+    N = len(data)
+    channels = np.shape(data[:1])[1:]
+    frame = np.zeros((frameSize,) + channels)
+    overlap = np.zeros((hop,) + channels)
+    # the first hop of output belongs to the zeros before the signal
+    skip = hop
+    for start in range(0, N + hop, hop):
+        chunk = data[start:start + hop]
+        frame[:hop] = frame[hop:]
+        frame[hop:hop + len(chunk)] = chunk
+        frame[hop + len(chunk):] = 0
+        spectrum = rfft(frame * window.reshape((-1,) + (1,) * len(channels)), axis=0)
+        synthesized = irfft(spectrum * gains.reshape((-1,) + (1,) * len(channels)), n=frameSize, axis=0)
+        block = overlap + synthesized[:hop]
+        overlap = synthesized[hop:]
+        block = block[skip:min(hop, N - start + hop)]
+        skip = 0
+        if len(block):
+            yield block
+
+def int16Scale(dtype):
+    # (offset, gain) that map samples of a wav dtype to the 16 bit range;
+    # 24 bit files come out of wavfile.read as left aligned int32
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        return 128, 2**8
+    if np.issubdtype(dtype, np.integer):
+        return 0, 2.0**(16 - 8 * dtype.itemsize)
+    return 0, 2**15
+
+def readWav(path):
+    # (fs, data) of a wav file, memory mapped where numpy can map the format;
+    # others (e.g. 24 bit) are read into memory. The samples are read-only
+    # either way, so every user can share them.
+    try:
+        fs, data = wavfile.read(path, mmap=True)
+    except ValueError:
+        fs, data = wavfile.read(path)
+    data = data.view()
+    data.setflags(write=False)
+    return fs, data
+
+def processFrequencyBandStream(inputPath, outputPath, factors, frameSize=8192):
+    # equalizes a wav file of any sample format into a 16 bit wav file without
+    # loading either one
+    fs, data = readWav(inputPath)
+    offset, gain = int16Scale(data.dtype)
+    output = wave.open(outputPath, 'wb')
+    try:
+        output.setnchannels(1 if data.ndim == 1 else data.shape[1])
+        output.setsampwidth(2)
+        output.setframerate(fs)
+        for block in equalizeStream(data, fs, factors, frameSize):
+            block = (block - offset) * gain
+            output.writeframes(np.clip(block, -2**15, 2**15 - 1).astype('<i2').tobytes())
+    finally:
+        output.close()
+
+class SpectrogramTiles(object):
+    # Power spectral density of a signal with the same parameters as
+    # plt.specgram's defaults (hanning window, NFFT 256, 50% overlap),
+    # computed in tiles of framesPerTile frames that are cached by position.
+    # Band gains are applied to the cached power of the unprocessed signal,
+    # so changing them or scrolling never needs a new transform.
+    NFFT = 256
+    noverlap = 128
+    framesPerTile = 256
+    maxTiles = 64
+
+    def __init__(self, data, fs):
+        self.data = data
+        self.fs = fs
+        self.hop = self.__class__.NFFT - self.__class__.noverlap
+        self.frameCount = max((len(data) - self.__class__.noverlap) // self.hop, 1)
+        self.frequencies = rfftfreq(self.__class__.NFFT, 1 / fs)
+        self.window = np.hanning(self.__class__.NFFT)
+        self.tiles = OrderedDict()
+        self.gains = None
+        # tiles are read from the GUI thread and the equalizer worker
+        self.lock = threading.RLock()
+
+    def setGains(self, factors):
+        # per-bin power gains; the bins the original addressing drops are kept
+        # here, as in equalizeStream
+        bandMap = bandIndexMap(self.__class__.NFFT, self.fs, len(factors))
+        gains = bandGains(np.minimum(bandMap, len(factors)), factors)
+        with self.lock:
+            self.gains = (gains ** 2).astype(np.float32).reshape((-1, 1))
+
+    def tile(self, idx):
+        # input power of frames idx * framesPerTile ... (idx + 1) * framesPerTile
+        if idx in self.tiles:
+            self.tiles.move_to_end(idx)
+            return self.tiles[idx]
+        NFFT = self.__class__.NFFT
+        firstFrame = idx * self.__class__.framesPerTile
+        frames = min(self.__class__.framesPerTile, self.frameCount - firstFrame)
+        chunk = np.zeros(((frames - 1) * self.hop + NFFT,))
+        samples = self.data[firstFrame * self.hop:firstFrame * self.hop + len(chunk)]
+        chunk[:len(samples)] = samples
+        segments = np.lib.stride_tricks.sliding_window_view(chunk, NFFT)[::self.hop]
+        power = np.abs(rfft(segments * self.window, axis=1)) ** 2
+        # one-sided density scaling, as matplotlib.mlab does it
+        power[:, 1:-1 if NFFT % 2 == 0 else None] *= 2
+        power /= self.fs * (self.window ** 2).sum()
+        self.tiles[idx] = power.T.astype(np.float32)
+        if len(self.tiles) > self.__class__.maxTiles:
+            self.tiles.popitem(last=False)
+        return self.tiles[idx]
+
+    def power(self, startFrame, stopFrame):
+        # (frequency, frame) power of frames startFrame ... stopFrame - 1
+        with self.lock:
+            startFrame = min(max(startFrame, 0), self.frameCount - 1)
+            stopFrame = min(max(stopFrame, startFrame + 1), self.frameCount)
+            first = startFrame // self.__class__.framesPerTile
+            last = (stopFrame - 1) // self.__class__.framesPerTile
+            power = np.concatenate([self.tile(idx) for idx in range(first, last + 1)], axis=1)
+            offset = first * self.__class__.framesPerTile
+            power = power[:, startFrame - offset:stopFrame - offset]
+            if self.gains is not None:
+                power = power * self.gains
+            return power
+
+def processFrequencyBandLoop(data, fs,factors):
+    # original per-bin implementation, kept as the reference for processFrequencyBand
     # Number of samples in signal
     N = len(data)
 
@@ -16,10 +226,10 @@ def processFrequencyBand(data, fs,factors):
     frequencies = rfftfreq(N, 1 / fs)
     # plt.plot(frequencies, signal_rfft_Coeff_abs)
     # plt.show()
-    
+
     # The maximum frequency is half the sample rate
     points_per_freq = len(frequencies) / (fs / 2)
-    
+
     for idx in range(len(factors)):
         low = ((fs / 2)/len(factors)) * idx
         # print("low: ",low)
@@ -34,7 +244,7 @@ def processFrequencyBand(data, fs,factors):
             else:
                 pass
 
-    # plt.plot(frequencies, signal_rfft_Coeff_abs)    
+    # plt.plot(frequencies, signal_rfft_Coeff_abs)
     # plt.show()
     # constructing fft coefficients again (from amplitudes and phases) after processing the amplitudes
     new_rfft_coeff = np.zeros((len(frequencies),), dtype=complex)
@@ -46,4 +256,21 @@ def processFrequencyBand(data, fs,factors):
             pass
 
     # constructing the new signal from the fft coeffs by inverse fft
-    return irfft(new_rfft_coeff)
\ No newline at end of file
+    return irfft(new_rfft_coeff)
+
+if __name__ == "__main__":
+    # compare both implementations on 5 seconds of noise at 44.1 kHz
+    fs = 44100
+    data = np.random.default_rng(0).integers(-2**15, 2**15, 5 * fs).astype(np.int16)
+    factors = np.linspace(0, 5, 10)
+
+    start = time.perf_counter()
+    expected = processFrequencyBandLoop(data, fs, factors)
+    loopTime = time.perf_counter() - start
+    processFrequencyBand(data, fs, factors)
+    start = time.perf_counter()
+    result = processFrequencyBand(data, fs, factors)
+    vectorTime = time.perf_counter() - start
+
+    print("max abs difference: ", np.max(np.abs(result - expected)))
+    print("loop: {:.3f} s, vectorized: {:.4f} s, speedup: {:.0f}x".format(loopTime, vectorTime, loopTime / vectorTime))
@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+from playback import Player, CaptureBackend, NullBackend
+
+fs = 8000
+
+
+class TestPlayer(unittest.TestCase):
+    # runs headless: blocks are pulled by hand through CaptureBackend
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.first = rng.uniform(-0.5, 0.5, 5000)
+        self.second = rng.uniform(-0.5, 0.5, 5000)
+        self.backend = CaptureBackend()
+        self.player = Player(self.backend)
+
+    def playToEnd(self):
+        while self.backend.player is not None:
+            self.backend.pull(1024)
+
+    def test_swap_mid_play(self):
+        self.player.play(self.first, fs)
+        self.backend.pull(1024)
+        self.player.play(self.second, fs)
+        block = self.backend.pull(1024)
+        # a buffer of the same shape carries on from the current position
+        np.testing.assert_allclose(block[:, 0], self.second[1024:2048], atol=1e-7)
+        self.assertEqual(self.player.position, 2048)
+
+    def test_end_of_buffer(self):
+        self.player.play(self.first, fs)
+        self.playToEnd()
+        captured = self.backend.captured()[:, 0]
+        np.testing.assert_allclose(captured[:5000], self.first, atol=1e-7)
+        self.assertFalse(np.any(captured[5000:]))
+        # the backend is not pulled for zeros past the end
+        self.assertFalse(self.player.playing)
+        self.assertIsNone(self.backend.player)
+
+    def test_swap_after_end(self):
+        self.player.play(self.first, fs)
+        self.playToEnd()
+        self.player.play(self.second, fs)
+        self.assertTrue(self.player.playing)
+        self.assertIs(self.backend.player, self.player)
+        block = self.backend.pull(1024)
+        np.testing.assert_allclose(block[:, 0], self.second[:1024], atol=1e-7)
+
+    def test_restart(self):
+        self.player.play(self.first, fs)
+        self.backend.pull(1024)
+        self.player.stop()
+        self.assertIsNone(self.backend.player)
+        self.player.play(self.first, fs)
+        block = self.backend.pull(1024)
+        np.testing.assert_allclose(block[:, 0], self.first[:1024], atol=1e-7)
+
+    def test_integer_samples(self):
+        data = np.array([-2**15, 0, 2**14, 2**15 - 1], dtype=np.int16)
+        self.player.play(data, fs)
+        block = self.backend.pull(4)
+        np.testing.assert_allclose(block[:, 0], data / 2**15)
+
+    def test_sample_types(self):
+        # every integer wav type plays at its own full scale
+        half = np.array([0.5, -0.5, 0.25, 0])
+        cases = [
+            (np.int32(half * 2**31), None),
+            (np.uint8(half * 2**7 + 128), None),
+            # equalized int16 audio is held as int32
+            (np.int32(half * 2**15), np.int16),
+        ]
+        for data, sampleType in cases:
+            self.player.play(data, fs, sampleType)
+            block = self.backend.pull(4)
+            np.testing.assert_allclose(block[:, 0], half, atol=1e-7)
+            self.player.stop()
+
+    def test_null_backend(self):
+        player = Player(NullBackend())
+        player.play(self.first, fs)
+        self.assertTrue(player.playing)
+        player.stop()
+        self.assertFalse(player.playing)
+        self.assertEqual(player.position, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
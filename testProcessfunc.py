@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+from processfunc import equalizeStream, processFrequencyBand
+
+fs = 44100
+
+
+def relativeError(actual, expected):
+    return np.sqrt(np.mean((actual - expected) ** 2) / np.mean(expected ** 2))
+
+
+class TestEqualizeStream(unittest.TestCase):
+    # equalizeStream against the whole-file processFrequencyBand
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def stream(self, data, factors, frameSize=8192):
+        return np.concatenate(list(equalizeStream(data, fs, factors, frameSize)))
+
+    def test_unit_gains(self):
+        for length in (3 * fs, 3 * fs + 1, 1000):
+            data = self.rng.standard_normal(length)
+            np.testing.assert_allclose(self.stream(data, np.ones(10)), data, atol=1e-9)
+
+    def test_tolerance(self):
+        # broadband noise, gains over the slider range (0 .. 5) and the worst
+        # case of alternating bands: within the 4% documented in equalizeStream
+        cases = [self.rng.uniform(0, 5, 10) for _ in range(5)] + [[0, 1] * 5, [1, 0] * 5]
+        for factors in cases:
+            data = self.rng.standard_normal(3 * fs + 2 * self.rng.integers(0, 500))
+            streamed = self.stream(data, factors)
+            self.assertEqual(len(streamed), len(data))
+            self.assertLess(relativeError(streamed, processFrequencyBand(data, fs, factors)), 0.04)
+
+    def test_mild_gains(self):
+        # a few dB between neighbouring bands stays around 2%
+        data = self.rng.standard_normal(3 * fs)
+        factors = [1, 1.2, 1.5, 1, 0.8, 1, 1, 1.3, 1, 1]
+        self.assertLess(relativeError(self.stream(data, factors), processFrequencyBand(data, fs, factors)), 0.02)
+
+    def test_stereo(self):
+        data = self.rng.standard_normal((2 * fs, 2))
+        factors = self.rng.uniform(0, 2, 10)
+        streamed = self.stream(data, factors)
+        self.assertEqual(streamed.shape, data.shape)
+        np.testing.assert_allclose(self.stream(data, np.ones(10)), data, atol=1e-9)
+        for channel in range(2):
+            np.testing.assert_allclose(streamed[:, channel], self.stream(data[:, channel], factors), atol=1e-12)
+            whole = processFrequencyBand(data[:, channel], fs, factors)
+            self.assertLess(relativeError(streamed[:, channel], whole), 0.04)
+
+    def test_odd_frame_size(self):
+        with self.assertRaises(ValueError):
+            self.stream(np.zeros(100), np.ones(10), 4095)
+
+
+if __name__ == '__main__':
+    unittest.main()